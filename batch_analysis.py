@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import time
+
+import openai
+
+import metrics
+import ml_analysis
+from bill_text import chunk_bill_html
+from llm_cache import LLMCache
+
+CHAT_COMPLETIONS = "/v1/chat/completions"
+
+# Per-batch limits of the Batch API, with headroom on the file size.
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 190 * 1024 * 1024
+
+# Batch states after which a batch will not change any more; a batch that
+# ended in one of UNUSABLE is submitted again on the next run.
+FINISHED = {"completed", "failed", "expired", "cancelled"}
+UNUSABLE = {"failed", "expired", "cancelled"}
+
+
+def batch_dir(datarun):
+    return os.path.join("Data", datarun, "batch")
+
+
+def state_path(datarun):
+    return os.path.join(batch_dir(datarun), "batches.json")
+
+
+def custom_id(bill_number, chunk):
+    return f"{bill_number}/{chunk}"
+
+
+def prepare_requests(df, model, context_paragraphs):
+    """
+    Reads and chunks every bill the way the interactive path does. Returns
+    the batch request lines for chunks the LLM cache cannot answer, and per
+    bill (cache key, cached issue list or None) of each chunk; a bill whose
+    HTML cannot be read maps to None.
+    """
+
+    lines = []
+    bill_chunks = {}
+    for bill in df.itertuples():
+        html_path = bill.local_pdf_path.replace(".pdf", ".html")
+        try:
+            html_content = ml_analysis.read_bill_html(html_path, context_paragraphs)
+        except OSError as e:
+            print(f"Could not read {html_path}: {e}")
+            bill_chunks[bill.bill_number] = None
+            continue
+
+        keys = []
+        for chunk, content in enumerate(
+            chunk_bill_html(html_content, ml_analysis.CHUNK_TOKENS)
+        ):
+            key = LLMCache.make_key(
+                content, model, ml_analysis.SYSTEM_MESSAGE, ml_analysis.TEMPERATURE
+            )
+            cached = ml_analysis.llm_cache.get(key)
+            if not isinstance(cached, list):
+                cached = None
+            keys.append((key, cached))
+            if cached is not None:
+                continue
+            request = {
+                "custom_id": custom_id(bill.bill_number, chunk),
+                "method": "POST",
+                "url": CHAT_COMPLETIONS,
+                "body": {
+                    "model": model,
+                    "messages": ml_analysis.build_messages(content),
+                    "temperature": ml_analysis.TEMPERATURE,
+                },
+            }
+            lines.append(json.dumps(request, separators=(",", ":")) + "\n")
+        bill_chunks[bill.bill_number] = keys
+    return lines, bill_chunks
+
+
+def write_batch_files(lines, datarun):
+    """
+    Splits the request lines into input files within the per-batch limits.
+    Returns their paths.
+    """
+
+    os.makedirs(batch_dir(datarun), exist_ok=True)
+    paths = []
+    f = None
+    count = size = 0
+    for line in lines:
+        encoded = len(line.encode("utf-8"))
+        if f is None or count == MAX_BATCH_REQUESTS or size + encoded > MAX_BATCH_BYTES:
+            if f is not None:
+                f.close()
+            path = os.path.join(batch_dir(datarun), f"input_{len(paths)}.jsonl")
+            f = open(path, "w", encoding="utf-8")
+            paths.append(path)
+            count = size = 0
+        f.write(line)
+        count += 1
+        size += encoded
+    if f is not None:
+        f.close()
+    return paths
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def resumable(client, batch_id):
+    try:
+        return client.batches.retrieve(batch_id).status not in UNUSABLE
+    except openai.NotFoundError:
+        return False
+
+
+def submit_batches(client, paths, datarun):
+    """
+    Uploads and submits each input file, unless the run's state file shows
+    the same file was already submitted, in which case that batch is picked
+    up again (after an interrupted run, say). Returns the batch ids.
+    """
+
+    try:
+        with open(state_path(datarun), "r", encoding="utf-8") as f:
+            submitted = json.load(f)
+    except FileNotFoundError:
+        submitted = {}
+
+    batch_ids = []
+    for path in paths:
+        sha256 = file_sha256(path)
+        if sha256 in submitted and resumable(client, submitted[sha256]):
+            print(f"Resuming batch {submitted[sha256]} for {path}")
+        else:
+            with open(path, "rb") as f:
+                input_file = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=CHAT_COMPLETIONS,
+                completion_window="24h",
+                metadata={"datarun": datarun},
+            )
+            submitted[sha256] = batch.id
+            tmp_path = state_path(datarun) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(submitted, f, indent=1)
+            os.replace(tmp_path, state_path(datarun))
+            print(f"Submitted batch {batch.id} for {path}")
+        batch_ids.append(submitted[sha256])
+    return batch_ids
+
+
+def wait_for_batches(client, batch_ids, poll_seconds):
+    start = time.time()
+    waiting = set(batch_ids)
+    batches = {}
+    while waiting:
+        for batch_id in sorted(waiting):
+            batch = client.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            if counts is not None:
+                print(
+                    f"Batch {batch_id}: {batch.status}, {counts.completed} of "
+                    f"{counts.total} done, {counts.failed} failed"
+                )
+            if batch.status in FINISHED:
+                batches[batch_id] = batch
+                waiting.discard(batch_id)
+        if waiting:
+            time.sleep(poll_seconds)
+    metrics.record("analyze", "batch", time.time() - start, start=start)
+    return [batches[batch_id] for batch_id in batch_ids]
+
+
+def read_file_lines(client, file_id):
+    if file_id is None:
+        return []
+    content = client.files.content(file_id).text
+    return [json.loads(line) for line in content.splitlines() if line]
+
+
+def collect_results(client, batches):
+    """
+    {custom_id: (status, issue list or None)} over the output and error
+    files of every batch. A request that errored is API_ERROR; a reply is
+    classified like an interactive one.
+    """
+
+    results = {}
+    for batch in batches:
+        if batch.status != "completed":
+            print(f"Batch {batch.id} ended {batch.status}: {batch.errors}")
+        lines = read_file_lines(client, batch.output_file_id)
+        lines += read_file_lines(client, batch.error_file_id)
+        for line in lines:
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") != 200 or line.get("error"):
+                error = line.get("error") or body.get("error")
+                print(f"{line['custom_id']} failed in the batch: {error}")
+                results[line["custom_id"]] = (ml_analysis.API_ERROR, None)
+                continue
+            usage = body.get("usage") or {}
+            metrics.record(
+                "analyze",
+                "batch_request",
+                0.0,
+                item=line["custom_id"],
+                model=body.get("model"),
+                tokens_in=usage.get("prompt_tokens", 0),
+                tokens_out=usage.get("completion_tokens", 0),
+            )
+            results[line["custom_id"]] = ml_analysis.classify_reply(
+                body["choices"][0]["message"]["content"]
+            )
+    return results
+
+
+def analyze_batch(df, datarun, model, context_paragraphs, on_result, poll_seconds=60):
+    """
+    Analyzes every bill of `df` through the Batch API: all chunks not in
+    the LLM cache go into batch input files, which are submitted and polled
+    until done. The results are mapped back by bill number, cached, written
+    to each bill's .json and passed to on_result like analyze_bills does.
+    Returns {local_pdf_path: status}; a bill takes the status of its first
+    failed chunk, and chunks missing from the results are API_ERROR.
+    """
+
+    lines, bill_chunks = prepare_requests(df, model, context_paragraphs)
+    print(f"{len(lines)} batch requests for {len(df)} bills")
+
+    results = {}
+    if lines:
+        client = openai.OpenAI()
+        batch_ids = submit_batches(client, write_batch_files(lines, datarun), datarun)
+        batches = wait_for_batches(client, batch_ids, poll_seconds)
+        results = collect_results(client, batches)
+
+    statuses = {}
+    for bill in df.to_dict("records"):
+        keys = bill_chunks[bill["bill_number"]]
+        if keys is None:
+            status, issue_data = ml_analysis.MISSING, None
+        else:
+            chunk_results = []
+            # Cache hits were looked up once, by prepare_requests.
+            for chunk, (key, cached) in enumerate(keys):
+                if cached is not None:
+                    chunk_results.append((ml_analysis.OK, cached))
+                    continue
+                outcome = results.get(
+                    custom_id(bill["bill_number"], chunk), (ml_analysis.API_ERROR, None)
+                )
+                if outcome[0] == ml_analysis.OK:
+                    ml_analysis.llm_cache.set(key, outcome[1], model)
+                chunk_results.append(outcome)
+            failed = [status for status, _ in chunk_results if status != ml_analysis.OK]
+            if failed:
+                status, issue_data = failed[0], None
+            elif len(chunk_results) == 1:
+                status, issue_data = chunk_results[0]
+            else:
+                status = ml_analysis.OK
+                issue_data = ml_analysis.merge_issue_lists(
+                    [issues for _, issues in chunk_results]
+                )
+
+        pdf_path = bill["local_pdf_path"]
+        with open(pdf_path.replace(".pdf", ".json"), "w") as f:
+            json.dump(issue_data, f, indent=4)
+        on_result(pdf_path, status, issue_data)
+        statuses[pdf_path] = status
+    return statuses
@@ -0,0 +1,998 @@
+import argparse
+import asyncio
+import email.parser
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from adobe.pdfservices.operation.exception.exceptions import ServiceApiException
+from adobe.pdfservices.operation.io.cloud_asset import CloudAsset
+from adobe.pdfservices.operation.io.stream_asset import StreamAsset
+from adobe.pdfservices.operation.pdf_services_response import PDFServicesResponse
+from bs4 import BeautifulSoup
+
+# Recorded pages and files served by the fake legislature site (see
+# `record`), and every benchmark run that passed, oldest first.
+BENCHMARK_DIR = "benchmarks"
+RECORDED_DIR = os.path.join(BENCHMARK_DIR, "recorded")
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, "results.jsonl")
+
+# The session the fake site serves, whatever the current year is.
+SESSION = "2025"
+BILL_INDEX_PATH = f"/sessioninfo/{SESSION}/legislation/"
+PDF_PATH = f"/wp-content/uploads/sessioninfo/{SESSION}/legislation/"
+
+DOCX_MIME_TYPE = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+)
+
+
+class Fixtures:
+    """
+    What the stand-ins serve: the bill index page, and per bill its detail
+    page, PDF and the .docx PDF Services would export from that PDF.
+    """
+
+    def __init__(self, index_html, details, pdfs, docx):
+        self.index_html = index_html
+        self.details = details
+        self.pdfs = pdfs
+        self.docx = docx
+
+    @property
+    def bill_numbers(self):
+        return sorted(self.pdfs)
+
+
+def synthetic_paragraphs(bill_number, sections, rng):
+    """
+    (text, format) paragraphs shaped like a bill: a title, then sections
+    of existing law with some text inserted ("u") or struck ("s").
+    """
+
+    words = (
+        "the agency shall may not person county district court fee permit "
+        "license record public notice within days section chapter provided "
+        "that any such board rule hearing"
+    ).split()
+
+    def sentence(length):
+        return " ".join(rng.choice(words) for _ in range(length)).capitalize() + "."
+
+    paragraphs = [(f"AN ACT RELATING TO {bill_number}; AMENDING SECTION 18-101.", "")]
+    for number in range(1, sections + 1):
+        paragraphs.append(
+            (
+                f"SECTION {number}. That Section 18-{number:03d}, "
+                "Idaho Code, be, and the same is hereby amended "
+                "to read as follows:",
+                "",
+            )
+        )
+        for _ in range(rng.randint(4, 10)):
+            paragraphs.append((sentence(rng.randint(12, 40)), ""))
+            edit = rng.random()
+            if edit < 0.3:
+                paragraphs.append((sentence(rng.randint(8, 25)), "u"))
+            elif edit < 0.45:
+                paragraphs.append((sentence(rng.randint(8, 25)), "s"))
+    return paragraphs
+
+
+def docx_bytes(paragraphs):
+    """
+    A minimal .docx holding `paragraphs`, underlined and struck runs
+    included, enough for mammoth to convert.
+    """
+
+    def run(text, fmt):
+        props = {"u": '<w:u w:val="single"/>', "s": "<w:strike/>"}.get(fmt, "")
+        text = text.replace("&", "&amp;").replace("<", "&lt;")
+        return f"<w:r><w:rPr>{props}</w:rPr><w:t>{text}</w:t></w:r>"
+
+    body = "".join(f"<w:p>{run(text, fmt)}</w:p>" for text, fmt in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+        f'wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.'
+            'openxmlformats.org/package/2006/content-types"><Default Extension='
+            '"rels" ContentType="application/vnd.openxmlformats-package.'
+            'relationships+xml"/><Default Extension="xml" ContentType='
+            '"application/xml"/><Override PartName="/word/document.xml" '
+            f'ContentType="{DOCX_MIME_TYPE}.main+xml"/></Types>',
+        )
+        docx.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="http:'
+            '//schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>',
+        )
+        docx.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+def pdf_bytes(bill_number, size):
+    """
+    A small valid PDF padded to about `size` bytes. Only its bytes matter:
+    scraping stores them and the fake PDF Services looks them up.
+    """
+
+    padding = "%" + "x" * 78 + "\n"
+    return (
+        b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+        b"2 0 obj << /Type /Pages /Kids [] /Count 0 >> endobj\n"
+        + f"% {bill_number}\n".encode()
+        + (padding * (size // len(padding))).encode()
+        + b"trailer << /Root 1 0 R >>\n%%EOF\n"
+    )
+
+
+def synthetic_fixtures(bills, seed=0):
+    """
+    Fixtures for `bills` made-up bills whose pages mirror the structure
+    scrape.py parses, for when nothing has been recorded.
+    """
+
+    rng = random.Random(seed)
+    bill_numbers = [f"H{number:04d}" for number in range(1, bills + 1)]
+    # The scraper skips the first two mini tables on the real page.
+    tables = ['<table class="mini-data-table"><tr><td>-</td></tr></table>'] * 2
+    details, pdfs, docx = {}, {}, {}
+    for bill_number in bill_numbers:
+        tables.append(
+            f'<table class="mini-data-table"><tr id="bill{bill_number}">'
+            f'<td><a href="{BILL_INDEX_PATH}{bill_number}">{bill_number}</a></td>'
+            f"<td>\n  Relating to <em>{bill_number.lower()}</em> fees &amp; "
+            f"permits\n</td><td></td>"
+            f"<td> {rng.choice(['H Jud', 'S St Aff', 'LAW'])} </td></tr></table>"
+        )
+        details[bill_number] = (
+            f'<html><body><table class="bill-table"><tr><td>{bill_number}</td>'
+            f"<td>aka</td><td>\n by <span>{rng.choice(['JUDICIARY', 'STATE'])}"
+            f"</span> COMMITTEE </td></tr></table></body></html>"
+        ).encode()
+        pdfs[bill_number] = pdf_bytes(bill_number, rng.randint(20000, 120000))
+        docx[bill_number] = docx_bytes(
+            synthetic_paragraphs(bill_number, rng.randint(1, 6), rng)
+        )
+    index_html = f"<html><body>{''.join(tables)}</body></html>".encode()
+    return Fixtures(index_html, details, pdfs, docx)
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_fixtures(bills):
+    """
+    Recorded fixtures if `record` was run, otherwise synthetic ones.
+    """
+
+    index_path = os.path.join(RECORDED_DIR, "index.html")
+    if not os.path.exists(index_path):
+        print(f"No recorded pages in {RECORDED_DIR}, using {bills} synthetic bills")
+        return synthetic_fixtures(bills)
+
+    details, pdfs, docx = {}, {}, {}
+    for name in sorted(os.listdir(os.path.join(RECORDED_DIR, "pdfs"))):
+        bill_number = name.removesuffix(".pdf")
+        details[bill_number] = read_bytes(
+            os.path.join(RECORDED_DIR, "details", bill_number + ".html")
+        )
+        pdfs[bill_number] = read_bytes(os.path.join(RECORDED_DIR, "pdfs", name))
+        docx[bill_number] = read_bytes(
+            os.path.join(RECORDED_DIR, "docx", bill_number + ".docx")
+        )
+    print(f"Using {len(pdfs)} recorded bills from {RECORDED_DIR}")
+    return Fixtures(read_bytes(index_path), details, pdfs, docx)
+
+
+def record(datarun, bills):
+    """
+    Saves the live bill index and the detail pages of the first `bills`
+    bills of `datarun`, with the PDFs and .docx exports that run already
+    downloaded, as the fixtures the benchmark serves.
+    """
+
+    import pandas as pd
+    import scrape
+
+    df = pd.read_csv(scrape.bill_csv_path(datarun))
+    df = df[
+        df["local_pdf_path"].map(
+            lambda path: os.path.exists(path.replace(".pdf", ".docx"))
+        )
+    ].head(bills)
+    kept = set(df["bill_number"])
+
+    for folder in ("details", "pdfs", "docx"):
+        os.makedirs(os.path.join(RECORDED_DIR, folder), exist_ok=True)
+
+    response = scrape.session.get(scrape.BASE_URL + BILL_INDEX_PATH, timeout=(3, 30))
+    response.raise_for_status()
+    # Keep the index to the recorded bills so every link on it resolves.
+    soup = BeautifulSoup(response.text, "html.parser")
+    for row in soup.find_all("tr", id=lambda x: x and x.startswith("bill")):
+        link = row.find("a")
+        if link and link["href"].split("/")[-1] not in kept:
+            row.find_parent("table").decompose()
+    with open(os.path.join(RECORDED_DIR, "index.html"), "w", encoding="utf-8") as f:
+        f.write(str(soup))
+
+    for bill in df.itertuples():
+        response = scrape.session.get(
+            scrape.BASE_URL + bill.detail_link, timeout=(3, 5)
+        )
+        response.raise_for_status()
+        with open(
+            os.path.join(RECORDED_DIR, "details", bill.bill_number + ".html"), "wb"
+        ) as f:
+            f.write(response.content)
+        shutil.copyfile(
+            bill.local_pdf_path,
+            os.path.join(RECORDED_DIR, "pdfs", bill.bill_number + ".pdf"),
+        )
+        shutil.copyfile(
+            bill.local_pdf_path.replace(".pdf", ".docx"),
+            os.path.join(RECORDED_DIR, "docx", bill.bill_number + ".docx"),
+        )
+        print(f"Recorded {bill.bill_number}")
+    print(f"Recorded {len(df)} bills to {RECORDED_DIR}")
+
+
+class FakeService:
+    """
+    Latency and throttling shared by the stand-ins: each call sleeps
+    `latency` seconds on average and is refused with a 429 with probability
+    `rate_429`.
+    """
+
+    def __init__(self, latency, rate_429, retry_after=1.0, seed=0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def delay(self):
+        """
+        Sleeps for one call and returns True if the call is throttled.
+        """
+
+        with self.lock:
+            self.calls += 1
+            jitter = 0.5 + self.random.random()
+            throttled = self.random.random() < self.rate_429
+            self.throttled += throttled
+        time.sleep(self.latency * jitter)
+        return throttled
+
+
+class FakeHTTPServer(FakeService):
+    """
+    FakeService answering HTTP on an ephemeral localhost port in a daemon
+    thread. Subclasses implement `respond(method, path, body, headers)`, returning
+    (status, content type, body).
+    """
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def handle_request(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if fake.delay():
+                    status, content_type, content = (
+                        429,
+                        "application/json",
+                        b'{"error": {"message": "Too many requests"}}',
+                    )
+                else:
+                    status, content_type, content = fake.respond(
+                        method, self.path, body, self.headers
+                    )
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", str(fake.retry_after))
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeLegislature(FakeHTTPServer):
+    """
+    Serves the bill index, detail pages and PDFs at the paths the real
+    site uses.
+    """
+
+    def __init__(self, fixtures, latency, rate_429):
+        super().__init__(latency, rate_429)
+        self.fixtures = fixtures
+
+    def respond(self, method, path, body, headers):
+        name = path.rstrip("/").split("/")[-1]
+        if path == BILL_INDEX_PATH:
+            return 200, "text/html", self.fixtures.index_html
+        if (
+            path.startswith(PDF_PATH)
+            and name.removesuffix(".pdf") in self.fixtures.pdfs
+        ):
+            return 200, "application/pdf", self.fixtures.pdfs[name.removesuffix(".pdf")]
+        if path.startswith(BILL_INDEX_PATH) and name in self.fixtures.details:
+            return 200, "text/html", self.fixtures.details[name]
+        return 404, "text/plain", b"not found"
+
+
+class FakeOpenAI(FakeHTTPServer):
+    """
+    Chat completions endpoint answering with a small issue list chosen from
+    the prompt's hash, and token usage estimated from its length.
+
+    Also stands in for the Batch API (file upload, batch create and
+    retrieve, file content): a batch reports in_progress for
+    `batch_latency` seconds, then completed, with each request failing
+    with probability `batch_failure_rate`.
+    """
+
+    ISSUES = [
+        {
+            "issue": "First Amendment concern",
+            "references": "U.S. Const. amend. I",
+            "explanation": "The notice requirement may burden protected speech.",
+        },
+        {
+            "issue": "Due process concern",
+            "references": "U.S. Const. amend. XIV",
+            "explanation": "The permit can be revoked without a hearing.",
+        },
+        {
+            "issue": "Equal protection concern",
+            "references": "U.S. Const. amend. XIV, § 1",
+            "explanation": "The fee applies to some counties and not others.",
+        },
+    ]
+
+    def __init__(self, latency, rate_429, batch_latency=2.0, batch_failure_rate=0.0):
+        super().__init__(latency, rate_429)
+        self.batch_latency = batch_latency
+        self.batch_failure_rate = batch_failure_rate
+        self.files = {}
+        self.batches = {}
+
+    def completion(self, request):
+        prompt = "".join(message["content"] for message in request["messages"])
+        count = hashlib.sha256(prompt.encode()).digest()[0] % (len(self.ISSUES) + 1)
+        content = json.dumps(self.ISSUES[:count])
+        return {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+        }
+
+    def store_file(self, content, purpose):
+        with self.lock:
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl",
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, request):
+        output, errors = [], []
+        for line in self.files[request["input_file_id"]].decode().splitlines():
+            item = json.loads(line)
+            with self.lock:
+                failed = self.random.random() < self.batch_failure_rate
+            if failed:
+                errors.append(
+                    {
+                        "id": f"batch_req_{len(errors)}",
+                        "custom_id": item["custom_id"],
+                        "response": {
+                            "status_code": 500,
+                            "body": {"error": {"message": "server error"}},
+                        },
+                        "error": None,
+                    }
+                )
+            else:
+                output.append(
+                    {
+                        "id": f"batch_req_{len(output)}",
+                        "custom_id": item["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": self.completion(item["body"]),
+                        },
+                        "error": None,
+                    }
+                )
+
+        def jsonl(lines):
+            return "".join(json.dumps(line) + "\n" for line in lines).encode()
+
+        with self.lock:
+            batch_id = f"batch_{len(self.batches)}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"],
+            "metadata": request.get("metadata"),
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "ready_at": time.time() + self.batch_latency,
+            "output_file_id": self.store_file(jsonl(output), "batch_output")["id"],
+            "error_file_id": (
+                self.store_file(jsonl(errors), "batch_output")["id"] if errors else None
+            ),
+            "request_counts": {
+                "total": len(output) + len(errors),
+                "completed": len(output),
+                "failed": len(errors),
+            },
+        }
+        self.batches[batch_id] = batch
+        return self.batch_view(batch)
+
+    def batch_view(self, batch):
+        view = {key: value for key, value in batch.items() if key != "ready_at"}
+        if time.time() < batch["ready_at"]:
+            view.update(
+                output_file_id=None,
+                error_file_id=None,
+                request_counts={**batch["request_counts"], "completed": 0, "failed": 0},
+            )
+        else:
+            view["status"] = "completed"
+        return view
+
+    def respond(self, method, path, body, headers):
+        path = path.removeprefix("/v1")
+        if path == "/chat/completions":
+            reply = self.completion(json.loads(body))
+        elif path == "/files" and method == "POST":
+            form = email.parser.BytesParser().parsebytes(
+                b"Content-Type: "
+                + headers["Content-Type"].encode()
+                + b"\r\n\r\n"
+                + body
+            )
+            fields = {
+                part.get_param("name", header="content-disposition"): part.get_payload(
+                    decode=True
+                )
+                for part in form.get_payload()
+            }
+            reply = self.store_file(fields["file"], fields["purpose"].decode())
+        elif path == "/batches" and method == "POST":
+            reply = self.create_batch(json.loads(body))
+        elif path.startswith("/batches/") and path[9:] in self.batches:
+            reply = self.batch_view(self.batches[path[9:]])
+        elif path.startswith("/files/") and path.endswith("/content"):
+            content = self.files.get(path[7:-8])
+            if content is None:
+                return 404, "application/json", b'{"error": {"message": "no file"}}'
+            return 200, "application/octet-stream", content
+        else:
+            return 404, "application/json", b'{"error": {"message": "not found"}}'
+        return 200, "application/json", json.dumps(reply).encode()
+
+
+class FakePDFServices(FakeService):
+    """
+    In-process stand-in for the PDFServices client used by pdf_to_html:
+    upload, submit, get_job_result and get_content, each with the service's
+    latency, and throttling raised as the SDK's ServiceApiException. The
+    export of a PDF is its recorded .docx.
+    """
+
+    def __init__(self, fixtures, latency, rate_429):
+        super().__init__(latency, rate_429)
+        self.docx = {
+            hashlib.sha256(fixtures.pdfs[bill_number]).hexdigest(): docx
+            for bill_number, docx in fixtures.docx.items()
+        }
+
+    def call(self):
+        if self.delay():
+            raise ServiceApiException("Too many requests", "benchmark", status_code=429)
+
+    def upload(self, input_stream, mime_type):
+        self.call()
+        return CloudAsset(hashlib.sha256(input_stream).hexdigest())
+
+    def submit(self, job):
+        self.call()
+        # The SDK keeps a job's input asset private.
+        return job._ExportPDFJob__input_asset.get_asset_id()
+
+    def get_job_result(self, location, result_type):
+        self.call()
+        return PDFServicesResponse("done", {}, result_type(CloudAsset(location)))
+
+    def get_content(self, asset):
+        self.call()
+        return StreamAsset(self.docx[asset.get_asset_id()], DOCX_MIME_TYPE)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def call_all(function, arguments, concurrency):
+    """
+    Calls `function` once per argument on `concurrency` threads; returns
+    the wall time, per-call latencies and the number of calls that raised.
+    """
+
+    def timed_call(argument):
+        start = time.perf_counter()
+        try:
+            function(argument)
+            failed = False
+        except Exception:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        calls = list(executor.map(timed_call, arguments))
+    return time.perf_counter() - start, [s for s, _ in calls], sum(f for _, f in calls)
+
+
+def result(items, seconds, latencies=None, errors=0):
+    latencies = latencies or []
+    return {
+        "items": items,
+        "seconds": round(seconds, 4),
+        "per_second": round(items / seconds, 3) if seconds else None,
+        "p50": round(percentile(latencies, 0.5), 4) if latencies else None,
+        "p95": round(percentile(latencies, 0.95), 4) if latencies else None,
+        "errors": errors,
+    }
+
+
+def compare_parsers(fixtures, repeat):
+    """
+    Runs the lxml and html.parser page parsers over the fixture pages,
+    checks that they extract the same rows and sponsors, and times both.
+    Returns {page kind: {parser: pages per second}} and the mismatches.
+    """
+
+    import scrape
+
+    pages = {
+        "index": (
+            scrape.BILL_INDEX_PARSERS,
+            [fixtures.index_html.decode("utf-8")],
+        ),
+        "detail": (
+            scrape.SPONSOR_PARSERS,
+            [page.decode("utf-8") for page in fixtures.details.values()],
+        ),
+    }
+    rates = {}
+    mismatches = []
+    for kind, (parsers, htmls) in pages.items():
+        outputs = {}
+        rates[kind] = {}
+        for name, parse in parsers.items():
+            parse(htmls[0])
+            start = time.perf_counter()
+            for _ in range(repeat):
+                outputs[name] = [parse(html) for html in htmls]
+            seconds = time.perf_counter() - start
+            rates[kind][name] = round(repeat * len(htmls) / seconds, 1)
+        for i, expected in enumerate(outputs["html.parser"]):
+            if outputs["lxml"][i] != expected:
+                mismatches.append((kind, i, expected, outputs["lxml"][i]))
+        print(
+            f"parse {kind}: "
+            + ", ".join(f"{name} {rate} pages/s" for name, rate in rates[kind].items())
+        )
+    for kind, i, expected, got in mismatches[:5]:
+        print(f"PARITY {kind} page {i}: html.parser {expected!r}, lxml {got!r}")
+    return rates, mismatches
+
+
+def reset_state(datarun, args):
+    """
+    Fresh manifests and LLM cache for one benchmark, so no stage skips
+    work an earlier benchmark already did.
+    """
+
+    import ml_analysis
+    import pdf_to_html
+    import scrape
+    from llm_cache import LLMCache
+    from scrape_manifest import ScrapeManifest
+
+    scrape.configure(datarun, args.concurrency, args.scrape_rate, session_name=SESSION)
+    scrape.manifest = ScrapeManifest(f"Data/scrape_manifest_{datarun}.json")
+    pdf_to_html.manifest = pdf_to_html.ConversionManifest(
+        f"Data/conversion_manifest_{datarun}.json"
+    )
+    ml_analysis.llm_cache = LLMCache(f"Data/llm_cache_{datarun}.sqlite")
+
+
+def run_benchmarks(args, fixtures, legislature, pdf_services):
+    """
+    Runs every benchmark in a fresh working directory and returns
+    {name: result}.
+    """
+
+    import metrics
+    import ml_analysis
+    import pdf_to_html
+    import pipeline
+    import scrape
+    import utils
+    from llm_cache import LLMCache
+    from rate_limiter import RequestTokenLimiter, TokenBucket
+
+    scrape.BASE_URL = legislature.url
+    pdf_to_html.pdf_services = pdf_services
+    pdf_to_html.rate_limiter = TokenBucket(args.convert_rate)
+    ml_analysis.request_limiter = TokenBucket(args.rpm / 60)
+    bills = fixtures.bill_numbers
+    results = {}
+
+    def report(name, outcome):
+        results[name] = outcome
+        print(
+            f"{name:>14}: {outcome['items']} in {outcome['seconds']:.2f}s, "
+            f"{outcome['per_second']}/s, p50 {outcome['p50']}, "
+            f"p95 {outcome['p95']}, {outcome['errors']} errors"
+        )
+
+    rates, mismatches = compare_parsers(fixtures, args.repeat)
+    for kind, parsers in rates.items():
+        results[f"parse_{kind}"] = {
+            "items": args.repeat,
+            "per_second": parsers[scrape.html_parser],
+            "errors": len(mismatches),
+        }
+
+    reset_state("scrape", args)
+    index_url = legislature.url + BILL_INDEX_PATH
+    seconds, latencies, errors = call_all(
+        scrape.scrape_idaho_legislation, [index_url] * args.repeat, 1
+    )
+    report("bill_index", result(args.repeat, seconds, latencies, errors))
+    bill_df = scrape.fetch_bill_index()
+
+    seconds, latencies, errors = call_all(
+        scrape.parse_detail_page, list(bill_df["detail_link"]), args.concurrency
+    )
+    report("detail_pages", result(len(bills), seconds, latencies, errors))
+
+    reset_state("scrape", args)
+    start = time.perf_counter()
+    scraped = scrape.scrape_bills(bill_df, args.concurrency)
+    report("scrape_bills", result(len(bills), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    timings = pdf_to_html.AdobeConverter().convert_all(
+        list(scraped["local_pdf_path"]), args.concurrency
+    )
+    report(
+        "convert",
+        result(
+            len(bills),
+            time.perf_counter() - start,
+            [seconds for stage, _, seconds, _ in timings if stage == "export"],
+            sum(error is not None for *_, error in timings),
+        ),
+    )
+
+    html_paths = [p.replace(".pdf", ".html") for p in scraped["local_pdf_path"]]
+    seconds, latencies, errors = call_all(
+        ml_analysis.analyze_legislation_html, html_paths, args.concurrency
+    )
+    report("analyze", result(len(bills), seconds, latencies, errors))
+
+    ml_analysis.llm_cache = LLMCache("Data/llm_cache_async.sqlite")
+    start = time.perf_counter()
+    statuses = asyncio.run(
+        ml_analysis.analyze_bills(
+            list(scraped["local_pdf_path"]),
+            ml_analysis.ANALYSIS_MODELS[0],
+            args.concurrency,
+            RequestTokenLimiter(args.rpm, args.tpm),
+            ml_analysis.COMPACTION_CONTEXT,
+        )
+    )
+    failed = sum(status != ml_analysis.OK for status in statuses.values())
+    report("analyze_async", result(len(bills), time.perf_counter() - start, [], failed))
+
+    # Batch first pass, with the bills that fail in the batch going through
+    # the interactive fallback.
+    ml_analysis.llm_cache = LLMCache("Data/llm_cache_batch.sqlite")
+    start = time.perf_counter()
+    statuses = ml_analysis.analyze_run(
+        scraped,
+        "scrape",
+        args.concurrency,
+        RequestTokenLimiter(args.rpm, args.tpm),
+        ml_analysis.COMPACTION_CONTEXT,
+        batch=True,
+        poll_seconds=0.5,
+    )
+    failed = sum(status != ml_analysis.OK for status in statuses.values())
+    report("analyze_batch", result(len(bills), time.perf_counter() - start, [], failed))
+
+    # End to end through the resumable pipeline, into a run of its own.
+    reset_state("end_to_end", args)
+    metrics.configure("end_to_end")
+    start = time.perf_counter()
+    run = pipeline.Pipeline(
+        "end_to_end",
+        backend="adobe",
+        scrape_concurrency=args.concurrency,
+        convert_workers=args.concurrency,
+        analysis_concurrency=args.concurrency,
+        limiter=RequestTokenLimiter(args.rpm, args.tpm),
+    )
+    df = asyncio.run(run.run())
+    ml_analysis.write_outputs(df, "end_to_end")
+    report(
+        "end_to_end",
+        result(len(bills), time.perf_counter() - start, [], run.counts["failed"]),
+    )
+    stages = metrics.summarize(metrics.load_metrics("end_to_end"))
+    print(stages.round(3).to_string(index=False))
+
+    os.environ["DATARUN"] = "end_to_end"
+    latencies = []
+    for _ in range(args.repeat):
+        utils.load_table.clear()
+        start = time.perf_counter()
+        utils.load_data()
+        latencies.append(time.perf_counter() - start)
+    report("load_data", result(args.repeat, sum(latencies), latencies))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(results, history, config, runs, tolerance):
+    """
+    Benchmarks whose throughput fell more than `tolerance` below the median
+    of the last `runs` recorded runs with the same configuration.
+    """
+
+    previous = [entry for entry in history if entry["config"] == config][-runs:]
+    regressions = []
+    for name, outcome in results.items():
+        baseline = [
+            entry["results"][name]["per_second"]
+            for entry in previous
+            if entry["results"].get(name, {}).get("per_second")
+        ]
+        if not baseline or not outcome["per_second"]:
+            continue
+        median = statistics.median(baseline)
+        if outcome["per_second"] < median * (1 - tolerance):
+            regressions.append((name, outcome["per_second"], median))
+    return regressions
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark the stages against local stand-ins for the "
+    "legislature site, OpenAI and PDF Services"
+)
+parser.add_argument(
+    "--record",
+    metavar="DATARUN",
+    help="instead of benchmarking, record fixtures from the live site and "
+    "the files DATARUN downloaded",
+)
+parser.add_argument(
+    "--parsers",
+    action="store_true",
+    help="only check that the lxml and html.parser page parsers agree, and "
+    "time them",
+)
+parser.add_argument("--bills", type=int, default=40, help="bills to benchmark")
+parser.add_argument("--repeat", type=int, default=5, help="index / load_data calls")
+parser.add_argument("--concurrency", type=int, default=8, help="workers per stage")
+parser.add_argument(
+    "--site-latency", type=float, default=0.05, help="legislature site seconds"
+)
+parser.add_argument(
+    "--site-429", type=float, default=0.0, help="legislature site 429 rate"
+)
+parser.add_argument("--openai-latency", type=float, default=0.5, help="seconds")
+parser.add_argument("--openai-429", type=float, default=0.05, help="OpenAI 429 rate")
+parser.add_argument("--adobe-latency", type=float, default=0.2, help="seconds")
+parser.add_argument(
+    "--adobe-429", type=float, default=0.0, help="PDF Services 429 rate"
+)
+parser.add_argument(
+    "--batch-latency", type=float, default=2.0, help="seconds until a batch completes"
+)
+parser.add_argument(
+    "--batch-failure-rate",
+    type=float,
+    default=0.05,
+    help="share of batch requests that fail and go to the interactive fallback",
+)
+parser.add_argument("--scrape-rate", type=float, default=10, help="requests/second")
+parser.add_argument("--convert-rate", type=float, default=10, help="calls/second")
+parser.add_argument("--rpm", type=int, default=500, help="OpenAI requests/minute")
+parser.add_argument("--tpm", type=int, default=450000, help="OpenAI tokens/minute")
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.2,
+    help="fail when throughput drops by more than this fraction",
+)
+parser.add_argument(
+    "--baseline-runs", type=int, default=5, help="recorded runs to compare against"
+)
+parser.add_argument(
+    "--accept",
+    action="store_true",
+    help="record the results even if they regressed (e.g. a new baseline)",
+)
+parser.add_argument(
+    "--dry-run", action="store_true", help="compare, but do not record results"
+)
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.record, args.bills)
+        return 0
+
+    cwd = os.getcwd()
+    fixtures = load_fixtures(args.bills)
+
+    if args.parsers:
+        _, mismatches = compare_parsers(fixtures, args.repeat)
+        return 1 if mismatches else 0
+    config = {
+        key: value
+        for key, value in vars(args).items()
+        if key
+        not in ("record", "parsers", "tolerance", "baseline_runs", "accept", "dry_run")
+    }
+    config["bills"] = len(fixtures.bill_numbers)
+    config["recorded"] = os.path.exists(os.path.join(RECORDED_DIR, "index.html"))
+
+    legislature = FakeLegislature(fixtures, args.site_latency, args.site_429).start()
+    openai_server = FakeOpenAI(
+        args.openai_latency,
+        args.openai_429,
+        args.batch_latency,
+        args.batch_failure_rate,
+    ).start()
+    pdf_services = FakePDFServices(fixtures, args.adobe_latency, args.adobe_429)
+    os.environ["OPENAI_BASE_URL"] = openai_server.url + "/v1"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as workspace:
+        os.chdir(workspace)
+        os.makedirs("Data")
+        try:
+            results = run_benchmarks(args, fixtures, legislature, pdf_services)
+        finally:
+            os.chdir(cwd)
+            legislature.stop()
+            openai_server.stop()
+
+    print(
+        f"Stand-ins: site {legislature.calls} calls ({legislature.throttled} 429s), "
+        f"OpenAI {openai_server.calls} ({openai_server.throttled}), "
+        f"PDF Services {pdf_services.calls} ({pdf_services.throttled})"
+    )
+
+    history = read_history(RESULTS_PATH)
+    regressions = find_regressions(
+        results, history, config, args.baseline_runs, args.tolerance
+    )
+    for name, per_second, median in regressions:
+        print(f"REGRESSION {name}: {per_second}/s against a median of {median}/s")
+
+    if not args.dry_run and (not regressions or args.accept):
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "config": config,
+            "results": results,
+        }
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Results appended to {RESULTS_PATH}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
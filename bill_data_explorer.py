@@ -1,18 +1,34 @@
+import math
+import numpy as np
 import streamlit as st
 import pandas as pd
 import os
 from pathlib import Path
-from utils import load_data
+from utils import (
+    SORT_ORDERS,
+    is_partial,
+    load_aggregates,
+    load_issues,
+    search_bills,
+    select_run,
+    similar_bills,
+)
 
+datarun = select_run()
 
-datarun = os.getenv("DATARUN")
+aggregates = load_aggregates()
+df = aggregates.bills
 
-df = load_data()
-
-status_options = ["All"] + sorted(df["bill_status"].dropna().unique().tolist())
-sponsor_options = ["All"] + sorted(df["sponsor"].dropna().unique().tolist())
+status_options = ["All"] + aggregates.status_options
+sponsor_options = ["All"] + aggregates.sponsor_options
 
 st.title("Idaho Bills – Ranked by Potential Constitutional Issues")
+if is_partial(datarun):
+    st.info(
+        f"The analysis of {datarun} is still running; showing the "
+        f"{len(df)} bills analyzed so far. Rerun the page to pick up new "
+        f"results. Search is available once the run finishes."
+    )
 st.markdown("""
 ## About This App
 
@@ -25,64 +41,138 @@ This dashboard uses the **OpenAI API** to scan every bill in the current Idaho l
   Each bill’s text is analyzed by OpenAI to surface possible issues (e.g. equal‑protection, due‑process, federal preemption).  
 
 - **Ranking**  
-  Bills are ranked by their **number of detected issues**.
+  Bills are ranked by their **number of detected issues**, or sorted by bill number.
 
 - **Filtering**  
   Use the **Status** and **Sponsor** selectors to narrow the list.  
 
+- **Search**  
+  Search bill titles, bill text and issue references and explanations; results are ranked by relevance.  
+
 - **Detail View**  
-  Click the 🔍 icon in any row to open the **Bill Details** dialog. There you’ll find:  
+  Select any row in the table to show its **Bill Details** below it. There you’ll find:  
   - A link to the official bill text on the Idaho Legislature website  
   - A full list of identified issues, with references and explanations  
+  - Companion and trailer bills that share most of its text  
 
 """)
 st.markdown("Please see status codes page for an explanation of the status codes")
 st.markdown(f"""Data scraped on `{datarun}`""")
 selected_status = st.selectbox("Filter by Status", status_options, index=0)
 selected_sponsor = st.selectbox("Filter by Sponsor", sponsor_options, index=0)
+query = st.text_input(
+    "Search titles, bill text and issues",
+    placeholder="e.g. firearm, Idaho Const. art. IX",
+).strip()
+
+
+positions = aggregates.filter_positions(
+    status=None if selected_status == "All" else selected_status,
+    sponsor=None if selected_sponsor == "All" else selected_sponsor,
+)
+
+snippets = {}
+if query:
+    hits = search_bills(query)
+    if hits is None:
+        if not is_partial(datarun):
+            st.warning(
+                f"No search index for this run yet; build it with "
+                f"`python search_index.py {datarun}`."
+            )
+    else:
+        snippets = {bill_number: snippet for bill_number, _, snippet in hits}
+        hit_positions = np.array(
+            [
+                aggregates.positions_by_bill[bill_number]
+                for bill_number, _, _ in hits
+                if bill_number in aggregates.positions_by_bill
+            ],
+            dtype=np.int64,
+        )
+        # Keep relevance order while applying the status/sponsor filters.
+        positions = hit_positions[np.isin(hit_positions, positions)]
 
-
-filtered = df
-if selected_status != "All":
-    filtered = filtered[filtered["bill_status"] == selected_status]
-if selected_sponsor != "All":
-    filtered = filtered[filtered["sponsor"] == selected_sponsor]
+PAGE_SIZES = [25, 50, 100]
 
 
-@st.dialog("Bill Details", width="large")
 def show_details(bill_number: str):
     row = df.loc[df["bill_number"] == bill_number].iloc[0]
-    st.header(f"{row.bill_number}: {row.bill_title}")
+    st.header(f"Bill Details – {row.bill_number}: {row.bill_title}")
     st.write("**Status:**", row.bill_status)
     st.write("**Sponsor:**", row.sponsor)
     # clickable link
     base_url = "https://legislature.idaho.gov"
     st.markdown(f"[View Full Text]({base_url + row.detail_link})")
-    issues = row.json_data or []
-    if issues:
+    issues = load_issues()
+    issues = issues.loc[issues["bill_number"] == bill_number]
+    if not issues.empty:
         st.subheader("Possible Constitutional Issues")
-        for i, issue in enumerate(issues, 1):
-            st.markdown(f"**{i}. {issue['issue']}**")
-            st.markdown(f"- **References:** {issue['references']}")
-            st.markdown(f"- **Explanation:** {issue['explanation']}")
+        for i, issue in enumerate(issues.itertuples(), 1):
+            st.markdown(f"**{i}. {issue.issue}**")
+            st.markdown(f"- **References:** {issue.references}")
+            st.markdown(f"- **Explanation:** {issue.explanation}")
     else:
         st.info("No issues analysis available.")
 
-
-c1, c2, c3, c4, c5, c6 = st.columns([1, 4, 2, 3, 1, 1])
-c1.markdown("**Bill #**")
-c2.markdown("**Title**")
-c3.markdown("**Status**")
-c4.markdown("**Sponsor**")
-c5.markdown("**Issues**")
-c6.markdown("**Detail**")
-
-for row in filtered.itertuples():
-    c1, c2, c3, c4, c5, c6 = st.columns([1, 4, 2, 3, 1, 1])
-    c1.write(row.bill_number)
-    c2.write(row.bill_title)
-    c3.write(row.bill_status)
-    c4.write(row.sponsor)
-    c5.write(row.issue_count)
-    if c6.button("🔍", key=f"btn_{row.bill_number}"):
-        show_details(row.bill_number)
+    st.subheader("Similar Bills")
+    similar = similar_bills(bill_number)
+    if similar is None:
+        st.caption(
+            f"No similarity index for this run yet; build it with "
+            f"`python bill_similarity.py {datarun}`."
+        )
+    elif not similar:
+        st.caption("No other bill of this run shares most of its text.")
+    else:
+        titles = df.set_index("bill_number")["bill_title"]
+        for other, similarity in similar:
+            st.markdown(
+                f"- **{other}** ({similarity:.0%} similar): {titles.get(other, '')}"
+            )
+
+
+c_sort, c_size = st.columns(2)
+sort_options = (["Relevance"] if snippets else []) + list(SORT_ORDERS)
+sort_by = c_sort.selectbox("Sort by", sort_options, index=0)
+page_size = c_size.selectbox("Rows per page", PAGE_SIZES, index=1)
+
+if sort_by == "Relevance":
+    ordered = positions
+else:
+    ordered = aggregates.sort_positions(positions, sort_by)
+
+page_count = max(1, math.ceil(len(ordered) / page_size))
+page = st.number_input(
+    f"Page (of {page_count})", min_value=1, max_value=page_count, value=1
+)
+page_df = df.iloc[ordered[(page - 1) * page_size : page * page_size]]
+table_columns = ["bill_number", "bill_title", "bill_status", "sponsor", "issue_count"]
+if snippets:
+    page_df = page_df.assign(match=page_df["bill_number"].map(snippets))
+    table_columns.append("match")
+st.caption(f"Showing {len(page_df)} of {len(ordered)} bills. Select a row for details.")
+
+# Only the current page is sent to the browser; the key changes with the
+# view so a stale row selection never points at a different bill.
+event = st.dataframe(
+    page_df[table_columns],
+    hide_index=True,
+    use_container_width=True,
+    on_select="rerun",
+    selection_mode="single-row",
+    key=f"bills_{selected_status}_{selected_sponsor}_{query}_{sort_by}_{page_size}_{page}",
+    column_config={
+        "bill_number": "Bill #",
+        "bill_title": st.column_config.TextColumn("Title", width="large"),
+        "bill_status": "Status",
+        "sponsor": "Sponsor",
+        "issue_count": "Issues",
+        "match": st.column_config.TextColumn("Match", width="large"),
+    },
+)
+
+selected_rows = event.selection.rows
+if selected_rows:
+    st.divider()
+    show_details(page_df.iloc[selected_rows[0]]["bill_number"])
@@ -0,0 +1,200 @@
+import glob
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import bill_store
+
+HISTORY_PATH = os.path.join("Data", "history.sqlite")
+
+HISTORY_COLUMNS = [
+    "session",
+    "datarun",
+    "bill_number",
+    "bill_title",
+    "bill_status",
+    "sponsor",
+    "issue_count",
+]
+
+
+def connect(path=HISTORY_PATH):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("""CREATE TABLE IF NOT EXISTS bills (
+            session TEXT,
+            datarun TEXT,
+            bill_number TEXT,
+            bill_title TEXT,
+            bill_status TEXT,
+            sponsor TEXT,
+            issue_count INTEGER,
+            PRIMARY KEY (session, datarun, bill_number)
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS bills_run ON bills (datarun)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS runs (
+            datarun TEXT PRIMARY KEY,
+            run_date TEXT,
+            sessions TEXT,
+            bills INTEGER,
+            issues INTEGER,
+            ingested REAL
+        )""")
+    conn.commit()
+    return conn
+
+
+def session_of(pdf_url):
+    """
+    The legislative session a bill PDF URL belongs to, e.g. "2025", or
+    "unknown" for URLs outside the legislature's session layout.
+    """
+
+    match = re.search(r"/sessioninfo/([^/]+)/", str(pdf_url))
+    return match.group(1) if match else "unknown"
+
+
+def run_date(datarun):
+    # Runs are named after the day they were scraped, possibly with a
+    # session suffix (see scrape.default_datarun). Runs named otherwise are
+    # dated by when they are ingested.
+    try:
+        scraped = datetime.strptime(datarun[:10], "%m_%d_%Y")
+    except ValueError:
+        scraped = datetime.now()
+    return scraped.date().isoformat()
+
+
+def history_rows(bills, datarun):
+    return pd.DataFrame(
+        {
+            "session": bills["pdf_url"].map(session_of),
+            "datarun": datarun,
+            "bill_number": bills["bill_number"],
+            "bill_title": bills["bill_title"].astype(str),
+            "bill_status": bills["bill_status"].astype(str),
+            "sponsor": bills["sponsor"].astype(str),
+            "issue_count": bills["issue_count"].astype(int),
+        }
+    )
+
+
+def ingest_run(conn, bill_chunks, datarun):
+    """
+    Replaces the history rows of `datarun` with its bills, given as frames
+    of the bills table or the enriched output one chunk at a time. Only that
+    run is touched, so ingesting a new run costs the same however many runs
+    came before it.
+    """
+
+    sessions = set()
+    bills = issues = 0
+    with conn:
+        conn.execute("DELETE FROM bills WHERE datarun = ?", (datarun,))
+        for chunk in bill_chunks:
+            rows = history_rows(chunk, datarun)
+            conn.executemany(
+                f"INSERT OR REPLACE INTO bills VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+                rows[HISTORY_COLUMNS].itertuples(index=False),
+            )
+            sessions.update(rows["session"])
+            bills += len(rows)
+            issues += int(rows["issue_count"].sum())
+        conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                datarun,
+                run_date(datarun),
+                ",".join(sorted(sessions)),
+                bills,
+                issues,
+                time.time(),
+            ),
+        )
+    print(f"Ingested {bills} bills of {datarun} into the history store")
+
+
+def list_runs(conn):
+    """
+    One row per ingested run and session it covers, newest first. Read
+    from the small per-run table, not the bill rows, so it stays cheap as
+    runs accumulate.
+    """
+
+    runs = pd.read_sql_query(
+        "SELECT sessions AS session, datarun, run_date, bills, issues FROM runs",
+        conn,
+    )
+    runs["session"] = runs["session"].str.split(",")
+    return (
+        runs.explode("session")
+        .sort_values(["run_date", "datarun"], ascending=False)
+        .reset_index(drop=True)
+    )
+
+
+def read_history(conn, session=None, dataruns=None, columns=None):
+    """
+    History rows, optionally only of one session and some runs, with each
+    run's date.
+    """
+
+    columns = columns or HISTORY_COLUMNS
+    query = (
+        f"SELECT {', '.join('b.' + column for column in columns)}, r.run_date "
+        "FROM bills b JOIN runs r ON r.datarun = b.datarun"
+    )
+    conditions, params = [], []
+    if session is not None:
+        conditions.append("b.session = ?")
+        params.append(session)
+    if dataruns is not None:
+        conditions.append(f"b.datarun IN ({', '.join('?' * len(dataruns))})")
+        params.extend(dataruns)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def sponsor_trend(conn, session):
+    """
+    Total issues and bills per sponsor in every run of `session`.
+    """
+
+    return pd.read_sql_query(
+        """SELECT b.datarun, r.run_date, b.sponsor,
+            SUM(b.issue_count) AS total_issues, COUNT(*) AS bills
+        FROM bills b JOIN runs r ON r.datarun = b.datarun
+        WHERE b.session = ?
+        GROUP BY b.datarun, b.sponsor""",
+        conn,
+        params=(session,),
+    )
+
+
+def stored_runs(root=bill_store.STORE_ROOT):
+    pattern = os.path.join(root, "bills", "datarun=*", "part-0.parquet")
+    return sorted(
+        os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+        for path in glob.glob(pattern)
+    )
+
+
+def main(argv=None):
+    # Ingest the runs in the Parquet store that are not in the history yet,
+    # or the runs given.
+    argv = sys.argv[1:] if argv is None else argv
+    conn = connect()
+    ingested = {datarun for (datarun,) in conn.execute("SELECT datarun FROM runs")}
+    dataruns = argv or [datarun for datarun in stored_runs() if datarun not in ingested]
+    for datarun in dataruns:
+        ingest_run(conn, [bill_store.read_table("bills", datarun)], datarun)
+    print(f"{len(ingested | set(dataruns))} runs in {HISTORY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import os
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from bill_text import split_sections
+
+# MinHash over word 5-gram shingles, with LSH in BANDS bands of ROWS rows.
+# Two bills with Jaccard similarity s share a band with probability
+# 1 - (1 - s**ROWS)**BANDS: about 0.5 at s = 0.42 and over 0.999 at
+# s = 0.8, so candidates are rarely missed. Every candidate is then scored
+# on its full signature.
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+
+# Mersenne prime for the permutations: hashes and coefficients stay under
+# 2**31, so (a * h + b) fits in an unsigned 64-bit integer.
+PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20250430)
+PERM_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+SHINGLE_BASE = np.uint64(1_000_003)
+
+# Bills at least this similar are listed as similar in the dashboard.
+SIMILAR_THRESHOLD = 0.5
+
+
+def bill_words(html_content):
+    return re.findall(r"\w+", re.sub(r"<[^>]+>", " ", html_content).lower())
+
+
+def shingle_hashes(words):
+    """
+    Hashes of every run of SHINGLE_WORDS consecutive words, computed as a
+    polynomial over the words' CRC32s with numpy rather than per shingle.
+    """
+
+    word_hashes = np.fromiter(
+        (zlib.crc32(word.encode()) % PRIME for word in words),
+        dtype=np.uint64,
+        count=len(words),
+    )
+    count = len(word_hashes) - SHINGLE_WORDS + 1
+    if count <= 0:
+        return word_hashes
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        shingles = (
+            shingles * SHINGLE_BASE + word_hashes[offset : offset + count]
+        ) % PRIME
+    return np.unique(shingles)
+
+
+def minhash(html_content):
+    hashes = shingle_hashes(bill_words(html_content))
+    if hashes.size == 0:
+        return np.full(NUM_PERM, PRIME, dtype=np.uint64)
+    return ((PERM_A[:, None] * hashes[None, :] + PERM_B[:, None]) % PRIME).min(axis=1)
+
+
+class SimilarityIndex:
+    """
+    MinHash signatures of a run's bills with an LSH table over them. Adding
+    a bill and querying one both touch only the bill's BANDS buckets and
+    the candidates found there, so building the index and querying every
+    bill stay close to linear in the number of bills.
+    """
+
+    def __init__(self):
+        self.bill_numbers = []
+        self.positions = {}
+        self.signatures = []
+        self.buckets = [{} for _ in range(BANDS)]
+
+    def add(self, bill_number, signature):
+        position = len(self.bill_numbers)
+        self.bill_numbers.append(bill_number)
+        self.positions[bill_number] = position
+        self.signatures.append(signature)
+        for band in range(BANDS):
+            key = signature[band * ROWS : (band + 1) * ROWS].tobytes()
+            self.buckets[band].setdefault(key, []).append(position)
+
+    def query(self, signature, threshold, exclude=None):
+        """
+        [(bill_number, estimated Jaccard similarity)] of the indexed bills
+        at least `threshold` similar to `signature`, most similar first.
+        """
+
+        candidates = set()
+        for band in range(BANDS):
+            key = signature[band * ROWS : (band + 1) * ROWS].tobytes()
+            candidates.update(self.buckets[band].get(key, ()))
+
+        matches = []
+        for position in candidates:
+            bill_number = self.bill_numbers[position]
+            if bill_number == exclude:
+                continue
+            score = float(np.mean(self.signatures[position] == signature))
+            if score >= threshold:
+                matches.append((bill_number, score))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+    def similar(self, bill_number, threshold=SIMILAR_THRESHOLD):
+        position = self.positions.get(bill_number)
+        if position is None:
+            return []
+        return self.query(self.signatures[position], threshold, exclude=bill_number)
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            bill_numbers=np.array(self.bill_numbers, dtype=str),
+            signatures=np.array(self.signatures, dtype=np.uint64).reshape(-1, NUM_PERM),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with np.load(path) as data:
+            for bill_number, signature in zip(data["bill_numbers"], data["signatures"]):
+                index.add(str(bill_number), signature)
+        return index
+
+
+def index_path(datarun):
+    return os.path.join("Data", datarun, f"similarity_{datarun}.npz")
+
+
+def read_html(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def build_index(df):
+    """
+    Index of the bills of a run's CSV rows whose HTML exists.
+    """
+
+    index = SimilarityIndex()
+    for bill in df.itertuples():
+        html_path = bill.local_pdf_path.replace(".pdf", ".html")
+        if os.path.exists(html_path):
+            index.add(bill.bill_number, minhash(read_html(html_path)))
+    return index
+
+
+def plan_reuse(index, bill_numbers, threshold):
+    """
+    Picks, in order, which bills are analyzed and which reuse an earlier
+    one. A bill at least `threshold` similar to a bill already chosen for
+    analysis becomes its duplicate; otherwise it is analyzed itself.
+    Returns {duplicate: (source, similarity)}.
+    """
+
+    analyzed = set()
+    duplicates = {}
+    for bill_number in bill_numbers:
+        sources = [
+            match
+            for match in index.similar(bill_number, threshold)
+            if match[0] in analyzed
+        ]
+        if sources:
+            duplicates[bill_number] = sources[0]
+        elif bill_number in index.positions:
+            analyzed.add(bill_number)
+    return duplicates
+
+
+def bill_parts(html_content):
+    """
+    (preamble, sections) of a bill, or ("", [whole bill]) for a bill
+    without SECTION headings such as a resolution or memorial.
+    """
+
+    preamble, *sections = split_sections(html_content)
+    if not sections:
+        return "", [html_content]
+    return preamble, sections
+
+
+def differing_sections(html_content, source_html):
+    """
+    (preamble, parts of `html_content` that do not appear byte for byte in
+    `source_html`). The preamble is a part too: when it differs it is
+    returned among the parts and the returned preamble is empty. No parts
+    means the bill's text is the source's.
+    """
+
+    preamble, sections = bill_parts(html_content)
+    source_preamble, source_sections = bill_parts(source_html)
+    known = set(source_sections)
+    differing = [section for section in sections if section not in known]
+    if preamble != source_preamble:
+        return "", ([preamble] if preamble else []) + differing
+    return preamble, differing
+
+
+def main(argv=None):
+    import pandas as pd
+
+    argv = sys.argv[1:] if argv is None else argv
+    datarun = argv[0] if argv else os.getenv("DATARUN")
+    if datarun is None:
+        print("Usage: python bill_similarity.py <DATARUN>")
+        return 1
+
+    df = pd.read_csv(os.path.join("Data", datarun, f"idaho_bills_{datarun}.csv"))
+    start = time.perf_counter()
+    index = build_index(df)
+    built = time.perf_counter() - start
+    index.save(index_path(datarun))
+
+    start = time.perf_counter()
+    pairs = {
+        tuple(sorted((bill_number, other))): score
+        for bill_number in index.bill_numbers
+        for other, score in index.similar(bill_number)
+    }
+    queried = time.perf_counter() - start
+    print(
+        f"Indexed {len(index.bill_numbers)} bills in {built:.2f}s, queried all "
+        f"in {queried:.2f}s; {len(pairs)} pairs at least "
+        f"{SIMILAR_THRESHOLD} similar"
+    )
+    for (a, b), score in sorted(pairs.items(), key=lambda item: -item[1])[:20]:
+        print(f"{a} ~ {b}: {score:.2f}")
+    print(f"Index written to {index_path(datarun)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import sys
+from collections import Counter
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from issue_clusters import canonical_issues
+from result_stream import CHUNK_RECORDS, read_chunks
+
+STORE_ROOT = os.path.join("Data", "parquet")
+
+BILL_CATEGORIES = ["bill_status", "sponsor"]
+ISSUE_COLUMNS = ["bill_number", "issue", "references", "explanation"]
+ISSUE_CATEGORIES = ["issue", "canonical_issue"]
+
+
+def issue_rows(df):
+    return [
+        (bill_number, *(str(issue.get(key, "")) for key in ISSUE_COLUMNS[1:]))
+        for bill_number, issue_list in zip(df["bill_number"], df["json_data"])
+        if isinstance(issue_list, list)
+        for issue in issue_list
+        if isinstance(issue, dict)
+    ]
+
+
+def split_enriched(df, canonical=None):
+    """
+    Splits an enriched frame (one row per bill with a nested `json_data`
+    issue list) into a `bills` table without the nesting and an `issues`
+    table with one row per issue, each labelled with the canonical issue
+    type its near-duplicate labels cluster to. `canonical` maps (issue,
+    references) to that label when the clustering was done over more bills
+    than `df`'s; by default `df`'s own issues are clustered.
+    """
+
+    bills = df.drop(columns=["json_data"]).reset_index(drop=True)
+    for column in BILL_CATEGORIES:
+        bills[column] = bills[column].astype("category")
+
+    issues = pd.DataFrame(issue_rows(df), columns=ISSUE_COLUMNS)
+    if canonical is None:
+        issues["canonical_issue"] = canonical_issues(
+            issues["issue"], issues["references"]
+        )
+    else:
+        issues["canonical_issue"] = [
+            canonical[pair] for pair in zip(issues["issue"], issues["references"])
+        ]
+    for column in ISSUE_CATEGORIES:
+        issues[column] = issues[column].astype("category")
+
+    return bills, issues
+
+
+def table_path(table, datarun, root=STORE_ROOT):
+    return os.path.join(root, table, f"datarun={datarun}", "part-0.parquet")
+
+
+def arrow_schema(frame):
+    # Fixed per column rather than inferred per chunk, so every chunk's
+    # table matches the file's schema even when a column is all null in it.
+    return pa.schema(
+        [
+            pa.field(
+                column,
+                (
+                    pa.dictionary(pa.int32(), pa.string())
+                    if isinstance(frame[column].dtype, pd.CategoricalDtype)
+                    else (
+                        pa.int64()
+                        if pd.api.types.is_integer_dtype(frame[column])
+                        else pa.string()
+                    )
+                ),
+            )
+            for column in frame.columns
+        ]
+    )
+
+
+def write_store(enriched_path, datarun, root=STORE_ROOT, chunksize=CHUNK_RECORDS):
+    """
+    Writes a run's tables from its enriched JSONL `chunksize` bills at a
+    time, so its analyses are never all in memory. A first pass counts and
+    clusters the distinct (issue, references) labels of the whole run; the
+    second splits each chunk and appends it to the tables' Parquet files.
+    """
+
+    pairs = Counter()
+    for chunk in read_chunks(enriched_path, chunksize):
+        pairs.update(
+            (issue, references) for _, issue, references, _ in issue_rows(chunk)
+        )
+    canonical = dict(
+        zip(
+            pairs,
+            canonical_issues(
+                [issue for issue, _ in pairs],
+                [references for _, references in pairs],
+                pairs.values(),
+            ),
+        )
+    )
+
+    writers = {}
+    counts = {"bills": 0, "issues": 0}
+    try:
+        for chunk in read_chunks(enriched_path, chunksize):
+            bills, issues = split_enriched(chunk, canonical)
+            for table, frame in (("bills", bills), ("issues", issues)):
+                arrow_table = pa.Table.from_pandas(
+                    frame, schema=arrow_schema(frame), preserve_index=False
+                )
+                if table not in writers:
+                    path = table_path(table, datarun, root)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writers[table] = pq.ParquetWriter(path + ".tmp", arrow_table.schema)
+                writers[table].write_table(arrow_table)
+                counts[table] += len(frame)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for table in writers:
+        path = table_path(table, datarun, root)
+        os.replace(path + ".tmp", path)
+    print(f"Wrote {counts['bills']} bills and {counts['issues']} issues to {root}")
+    return counts["bills"], counts["issues"]
+
+
+def has_store(datarun, root=STORE_ROOT):
+    return os.path.exists(table_path("bills", datarun, root))
+
+
+def read_table(table, datarun, columns=None, root=STORE_ROOT):
+    return pd.read_parquet(table_path(table, datarun, root), columns=columns)
+
+
+if __name__ == "__main__":
+    # Backfill the store for a run that only has its enriched JSONL.
+    datarun = sys.argv[1] if len(sys.argv) > 1 else os.getenv("DATARUN")
+    if datarun is None:
+        print("Usage: python bill_store.py <DATARUN>")
+        sys.exit(1)
+    write_store(os.path.join("Data", f"idaho_bills_enriched_{datarun}.jsonl"), datarun)
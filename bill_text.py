@@ -0,0 +1,198 @@
+import hashlib
+import math
+import re
+from html import escape
+
+from bs4 import BeautifulSoup, NavigableString
+
+# Rough characters-per-token ratio for English prose and light HTML markup.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+BLOCK_TAGS = ["p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "tr"]
+EDIT_TAGS = ["u", "s"]
+
+# Section and statute headings kept even when unchanged, e.g. "SECTION 2."
+# or "18-8602. DEFINITIONS."
+HEADER_PATTERN = re.compile(
+    r"^\s*(SECTION\s+\d+|CHAPTER\s+\d+|\d+-\d+[A-Z]?\.|TITLE\s+\d+)", re.IGNORECASE
+)
+
+OMITTED = "[...]"
+
+# The preamble (bill number, title, enacting clause) is kept up to this many
+# blocks, in case a bill has no enacting clause to stop at.
+MAX_PREAMBLE_BLOCKS = 15
+
+
+def clean_block(block):
+    """
+    Render a block as minimal HTML: only <u> and <s> markup survives, the
+    ids, anchors and inline styling mammoth emits are dropped.
+    """
+
+    parts = []
+    for node in block.descendants:
+        if isinstance(node, NavigableString):
+            text = str(node)
+            if not text.strip():
+                parts.append(" ")
+                continue
+            # Every <u>/<s> between the text and the block, outermost first:
+            # mammoth nests them for text that is both inserted and struck.
+            edits = []
+            for parent in node.parents:
+                if parent is block:
+                    break
+                if parent.name in EDIT_TAGS and parent.name not in edits:
+                    edits.insert(0, parent.name)
+            text = escape(text, quote=False)
+            opening = "".join(f"<{edit}>" for edit in edits)
+            closing = "".join(f"</{edit}>" for edit in reversed(edits))
+            parts.append(f"{opening}{text}{closing}")
+    html = re.sub(r"\s+", " ", "".join(parts)).strip()
+    return re.sub(r"</(u|s)>\s*<\1>", " ", html)
+
+
+def compact_bill_html(html_content, context_paragraphs=2):
+    """
+    Shrink a mammoth bill to what the analysis needs: every paragraph with
+    inserted (<u>) or struck (<s>) text, `context_paragraphs` paragraphs on
+    each side of it, section/statute headings and the bill's preamble.
+    Skipped runs of unchanged law are replaced with "[...]".
+
+    Bills without any <u>/<s> markup (e.g. new chapters) are all new text,
+    so they are returned whole, only stripped of markup noise.
+    """
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    blocks = [
+        block
+        for block in soup.find_all(BLOCK_TAGS)
+        if not block.find_parent(BLOCK_TAGS)
+    ]
+    if not blocks:
+        return html_content
+
+    cleaned = [clean_block(block) for block in blocks]
+    edited = [bool(block.find(EDIT_TAGS)) for block in blocks]
+
+    if not any(edited):
+        return "\n".join(f"<p>{text}</p>" for text in cleaned if text)
+
+    keep = [False] * len(blocks)
+    in_preamble = True
+    for i, text in enumerate(cleaned):
+        if in_preamble and i < MAX_PREAMBLE_BLOCKS:
+            keep[i] = True
+            if "BE IT ENACTED" in text.upper():
+                in_preamble = False
+        if HEADER_PATTERN.match(text):
+            keep[i] = True
+        if edited[i]:
+            low = max(0, i - context_paragraphs)
+            high = min(len(blocks), i + context_paragraphs + 1)
+            for j in range(low, high):
+                keep[j] = True
+
+    lines = []
+    for text, kept in zip(cleaned, keep):
+        if kept:
+            if text:
+                lines.append(f"<p>{text}</p>")
+        elif not lines or lines[-1] != OMITTED:
+            lines.append(OMITTED)
+    return "\n".join(lines)
+
+
+SECTION_PATTERN = re.compile(r"^\s*SECTION\s+\d+", re.IGNORECASE)
+
+
+def split_blocks(html_content):
+    return [
+        block
+        for block in re.split(r"(?=<(?:p|h[1-6]|table|ul|ol)[\s>])", html_content)
+        if block.strip()
+    ]
+
+
+def block_text(block):
+    return re.sub(r"<[^>]+>", "", block).strip()
+
+
+def split_sections(html_content):
+    """
+    Splits a bill at its "SECTION n." headings. The first element is the
+    preamble before the first section (empty if the bill opens with one).
+    """
+
+    sections = [[]]
+    for block in split_blocks(html_content):
+        if SECTION_PATTERN.match(block_text(block)):
+            sections.append([])
+        sections[-1].append(block)
+    return ["".join(section) for section in sections]
+
+
+def section_digest(section):
+    """
+    Hash of a section's text and <u>/<s> edits, which is what its analysis
+    depends on. The markup noise that differs between conversions and the
+    section's number, which changes when an amendment inserts a section
+    before it, are left out.
+    """
+
+    soup = BeautifulSoup(section, "html.parser")
+    blocks = [
+        block
+        for block in soup.find_all(BLOCK_TAGS)
+        if not block.find_parent(BLOCK_TAGS)
+    ]
+    text = "\n".join(clean_block(block) for block in blocks) or section
+    text = re.sub(r"^(\s*SECTION\s+)\d+", r"\1", text, flags=re.IGNORECASE)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_bill_html(html_content, max_tokens):
+    """
+    Splits a bill larger than `max_tokens` into chunks of whole sections,
+    packing consecutive sections together up to the limit. A single section
+    that is still too large is split between paragraphs. The preamble is
+    repeated at the top of every chunk so each one has the bill's title.
+    """
+
+    if estimate_tokens(html_content) <= max_tokens:
+        return [html_content]
+
+    preamble, *sections = split_sections(html_content)
+    if estimate_tokens(preamble) > max_tokens // 4:
+        sections = [preamble] + sections
+        preamble = ""
+    budget = max_tokens - estimate_tokens(preamble)
+
+    pieces = []
+    for section in sections:
+        if estimate_tokens(section) <= budget:
+            pieces.append(section)
+        else:
+            pieces.extend(split_blocks(section))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_tokens(current + piece) > budget:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+
+    return [preamble + chunk for chunk in chunks]
+
+
+def html_to_text(html_content):
+    return BeautifulSoup(html_content, "html.parser").get_text(" ", strip=True)
@@ -0,0 +1,119 @@
+import argparse
+import importlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# Subcommand: (module whose main(argv) runs it, help). A module is imported
+# only when its subcommand runs, so e.g. `cli.py scrape` never loads openai
+# or the Adobe SDK.
+COMMANDS = {
+    "scrape": ("scrape", "scrape a session's bills into a new run"),
+    "convert": ("pdf_to_html", "convert the run's PDFs to HTML"),
+    "analyze": ("ml_analysis", "analyze the run's bills with OpenAI"),
+    "pipeline": ("pipeline", "scrape, convert and analyze in one streaming pass"),
+    "similarity": ("bill_similarity", "index a run's near-duplicate bills"),
+    "history": ("bill_history", "add stored runs to the history store"),
+    "metrics": ("metrics", "summarize a run's stage metrics"),
+    "benchmark": ("benchmark", "benchmark the stages against local stand-ins"),
+}
+
+# Milliseconds `import <module>` may take, measured with
+# `python -X importtime` in a fresh interpreter. About twice what each
+# module took when the budgets were set, so only a new eager import of a
+# heavy dependency (pandas alone is ~0.3s) goes over.
+IMPORT_BUDGETS = {
+    "cli": 50,
+    "scrape": 250,
+    "pdf_to_html": 150,
+    "ml_analysis": 250,
+    "pipeline": 400,
+    "bill_similarity": 300,
+    "bill_history": 1000,
+    "metrics": 50,
+    "benchmark": 250,
+}
+
+
+def import_seconds(module, repeat=3):
+    """
+    Best of `repeat` cumulative import times of `module` in a fresh
+    interpreter, run in an empty directory so the import cannot read or
+    create run data.
+    """
+
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    with tempfile.TemporaryDirectory(prefix="importtime_") as workspace:
+        for _ in range(repeat):
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                cwd=workspace,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if completed.returncode != 0:
+                raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+            # "import time: <self us> | <cumulative us> | <module>"
+            match = re.search(
+                rf"^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$",
+                completed.stderr,
+                re.MULTILINE,
+            )
+            times.append(int(match.group(1)) / 1e6)
+    return min(times)
+
+
+def check_startup(modules, repeat):
+    over = []
+    print(f"{'module':<16} {'import':>9} {'budget':>9}")
+    for module in modules:
+        seconds = import_seconds(module, repeat)
+        budget = IMPORT_BUDGETS[module] / 1000
+        flag = "  OVER BUDGET" if seconds > budget else ""
+        print(f"{module:<16} {seconds * 1000:>7.0f}ms {budget * 1000:>7.0f}ms{flag}")
+        if seconds > budget:
+            over.append(module)
+    return 1 if over else 0
+
+
+parser = argparse.ArgumentParser(
+    description="Idaho legislation analysis",
+    epilog="Run `cli.py <command> --help` for a command's options.",
+)
+subparsers = parser.add_subparsers(dest="command", required=True)
+for command, (_, summary) in COMMANDS.items():
+    # The stage's own parser handles its options, including --help.
+    subparsers.add_parser(command, help=summary, add_help=False)
+startup = subparsers.add_parser(
+    "startup", help="check the stage modules' import times against their budgets"
+)
+startup.add_argument(
+    "modules",
+    nargs="*",
+    help=f"modules to measure, of {', '.join(IMPORT_BUDGETS)} (default: all)",
+)
+startup.add_argument(
+    "--repeat", type=int, default=3, help="imports per module; the fastest counts"
+)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args, rest = parser.parse_known_args(argv)
+    if args.command == "startup":
+        parser.parse_args(argv)
+        unknown = set(args.modules) - set(IMPORT_BUDGETS)
+        if unknown:
+            startup.error(f"no import budget for {', '.join(sorted(unknown))}")
+        return check_startup(args.modules or list(IMPORT_BUDGETS), args.repeat)
+
+    module, _ = COMMANDS[args.command]
+    return importlib.import_module(module).main(rest) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import os
+import time
+
+import mammoth
+
+# Mammoth drops underlines unless they are mapped; they mark inserted text.
+STYLE_MAP = """u => u
+strike => s
+"""
+
+
+def docx_to_html_mammoth(docx_filename, html_filename):
+    """
+    Convert a .docx to .html using the Mammoth library.
+    Saves HTML result to 'html_filename'.
+    """
+
+    docx_abs = os.path.abspath(docx_filename)
+    html_abs = os.path.abspath(html_filename)
+
+    with open(docx_abs, "rb") as docx_file:
+        result = mammoth.convert_to_html(docx_file, style_map=STYLE_MAP)
+        html_content = result.value
+
+    # Replace rather than overwrite, in case html_filename is hard-linked
+    # from an earlier run.
+    tmp_path = html_abs + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(html_content)
+    os.replace(tmp_path, html_abs)
+
+    print(f"DOCX converted to HTML successfully: {html_abs}")
+
+
+def convert_docx_timed(docx_filename, html_filename):
+    """
+    Process-pool entry point. Never raises, so one corrupt DOCX cannot stop
+    the stage; returns (html_filename, seconds, error message or None).
+    """
+
+    start = time.perf_counter()
+    try:
+        docx_to_html_mammoth(docx_filename, html_filename)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return html_filename, time.perf_counter() - start, error
@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+NGRAM_RANGE = (3, 5)
+
+# Words that say nothing about which constitutional issue a label names.
+NOISE_WORDS = {
+    "a",
+    "an",
+    "and",
+    "by",
+    "concern",
+    "concerns",
+    "conflict",
+    "issue",
+    "issues",
+    "law",
+    "of",
+    "possible",
+    "potential",
+    "the",
+    "to",
+    "under",
+    "violation",
+    "with",
+}
+
+# References only nudge similarity; many different issues cite the same
+# amendment (e.g. equal protection and due process both cite the XIV).
+REFERENCES_WEIGHT = 0.35
+
+SIMILARITY_THRESHOLD = 0.6
+
+# Rows of the similarity product computed at a time, to bound memory.
+BLOCK_SIZE = 2000
+
+
+def normalize(text):
+    words = re.findall(r"[a-z0-9]+", str(text).lower())
+    return " ".join(word for word in words if word not in NOISE_WORDS)
+
+
+def char_ngrams(text):
+    padded = f" {text} "
+    low, high = NGRAM_RANGE
+    return [
+        padded[i : i + n]
+        for n in range(low, high + 1)
+        for i in range(len(padded) - n + 1)
+    ]
+
+
+def unit_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def tfidf_matrix(texts, analyzer):
+    """
+    TF-IDF of the terms `analyzer` splits each text into (sublinear tf,
+    smoothed idf, rows scaled to unit length) as a CSR matrix, built from
+    flat index arrays in one pass.
+    """
+
+    vocabulary = {}
+    indices = []
+    counts = []
+    indptr = [0]
+    for text in texts:
+        grams = Counter(analyzer(text))
+        indices.extend(vocabulary.setdefault(gram, len(vocabulary)) for gram in grams)
+        counts.extend(grams.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (
+            1 + np.log(np.asarray(counts, dtype=np.float64)),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(indptr, dtype=np.int64),
+        ),
+        shape=(len(texts), len(vocabulary)),
+    )
+    document_frequency = np.bincount(matrix.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+    return unit_rows(matrix @ sparse.diags(idf))
+
+
+def label_vectors(texts):
+    """
+    Character n-grams catch spelling and inflection variants, but on their
+    own they rate "fourth amendment" close to "fourteenth amendment"; half
+    the weight goes to whole words so the distinguishing word still counts.
+    """
+
+    return unit_rows(
+        sparse.hstack(
+            [tfidf_matrix(texts, char_ngrams), tfidf_matrix(texts, str.split)]
+        ).tocsr()
+    )
+
+
+def cluster_labels(vectors, threshold=SIMILARITY_THRESHOLD):
+    """
+    Connected components of the graph linking rows whose cosine similarity
+    is at least `threshold`. The similarity product is computed in row
+    blocks and thresholded immediately, so only the edges are ever kept.
+    """
+
+    vectors = sparse.csr_matrix(vectors)
+    transposed = vectors.T.tocsc()
+    rows = []
+    cols = []
+    for start in range(0, vectors.shape[0], BLOCK_SIZE):
+        block = (vectors[start : start + BLOCK_SIZE] @ transposed).tocoo()
+        keep = block.data >= threshold
+        rows.append(block.row[keep] + start)
+        cols.append(block.col[keep])
+
+    n = vectors.shape[0]
+    graph = sparse.coo_matrix(
+        (
+            np.ones(sum(len(r) for r in rows)),
+            (np.concatenate(rows), np.concatenate(cols)),
+        ),
+        shape=(n, n),
+    )
+    _, component = connected_components(graph, directed=False)
+    return component
+
+
+def canonical_issues(issues, references=None, counts=None):
+    """
+    Maps every issue label to a canonical label: near-duplicates such as
+    "First Amendment concern", "First Amendment Concern" and "Free speech
+    (First Amendment)" collapse to the most frequent spelling in their
+    cluster. Clustering runs once over the distinct (issue, references)
+    pairs in a single vectorized pass.
+
+    `counts` gives how many times each row occurs, so a caller can pass
+    each distinct label once; by default every row counts once.
+
+    Returns a list aligned with `issues`.
+    """
+
+    issues = (
+        pd.Series(issues, dtype="object").fillna("").astype(str).reset_index(drop=True)
+    )
+    if references is None:
+        references = pd.Series([""] * len(issues))
+    references = (
+        pd.Series(references, dtype="object")
+        .fillna("")
+        .astype(str)
+        .reset_index(drop=True)
+    )
+    if issues.empty:
+        return []
+
+    pairs = pd.DataFrame({"issue": issues, "references": references})
+    pairs["n"] = 1 if counts is None else list(counts)
+    pairs["issue_key"] = pairs["issue"].map(normalize)
+    pairs["references_key"] = pairs["references"].map(normalize)
+    distinct = pairs.drop_duplicates(["issue_key", "references_key"]).reset_index(
+        drop=True
+    )
+
+    vectors = unit_rows(
+        sparse.hstack(
+            [
+                label_vectors(distinct["issue_key"].tolist()),
+                REFERENCES_WEIGHT * label_vectors(distinct["references_key"].tolist()),
+            ]
+        ).tocsr()
+    )
+
+    distinct["cluster"] = cluster_labels(vectors)
+    pairs = pairs.merge(
+        distinct[["issue_key", "references_key", "cluster"]],
+        on=["issue_key", "references_key"],
+        how="left",
+    )
+
+    # The most used spelling names the cluster; shorter wins a tie.
+    frequency = pairs.groupby(["cluster", "issue"])["n"].sum().reset_index()
+    frequency["length"] = frequency["issue"].str.len()
+    names = (
+        frequency.sort_values(["n", "length"], ascending=[False, True])
+        .drop_duplicates("cluster")
+        .set_index("cluster")["issue"]
+    )
+    return pairs["cluster"].map(names).tolist()
+
+
+if __name__ == "__main__":
+    # Benchmark on a run's enriched JSONL, then on a corpus scaled up to
+    # tens of thousands of issues with perturbed labels.
+    datarun = sys.argv[1] if len(sys.argv) > 1 else os.getenv("DATARUN", "04_30_2025")
+    enriched = pd.read_json(
+        os.path.join("Data", f"idaho_bills_enriched_{datarun}.jsonl"),
+        orient="records",
+        lines=True,
+    )
+    issues = pd.DataFrame(
+        [issue for issue_list in enriched["json_data"] for issue in issue_list]
+    )
+
+    start = time.perf_counter()
+    canonical = canonical_issues(issues["issue"], issues["references"])
+    elapsed = time.perf_counter() - start
+    print(
+        f"{datarun}: {len(issues)} issues, {issues['issue'].nunique()} labels -> "
+        f"{len(set(canonical))} canonical labels in {elapsed:.3f}s"
+    )
+    merged = (
+        pd.DataFrame({"canonical": canonical, "issue": issues["issue"]})
+        .drop_duplicates()
+        .groupby("canonical")["issue"]
+        .apply(list)
+    )
+    for name, labels in merged.items():
+        if len(labels) > 1:
+            print(f"  {name}: {labels}")
+
+    # Synthetic variants the way the model drifts: casing, filler words and
+    # the odd dropped letter.
+    rng = np.random.default_rng(0)
+    fillers = ["{} concern", "{} concerns", "Potential violation of {}", "{} issue"]
+    for target in (10_000, 50_000):
+        picks = rng.integers(0, len(issues), target)
+        labels = []
+        for pick in picks:
+            label = issues["issue"].iloc[pick]
+            roll = rng.random()
+            if roll < 0.3:
+                label = fillers[rng.integers(len(fillers))].format(label)
+            elif roll < 0.5:
+                label = label.lower() if roll < 0.4 else label.title()
+            elif roll < 0.6:
+                i = rng.integers(len(label))
+                label = label[:i] + label[i + 1 :]
+            labels.append(label)
+        references = issues["references"].iloc[picks].tolist()
+        start = time.perf_counter()
+        canonical = canonical_issues(labels, references)
+        elapsed = time.perf_counter() - start
+        print(
+            f"synthetic: {target} issues, {len(set(labels))} labels -> "
+            f"{len(set(canonical))} canonical labels in {elapsed:.2f}s"
+        )
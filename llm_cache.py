@@ -0,0 +1,121 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class LLMCache:
+    """
+    On-disk cache of parsed model responses, keyed on everything that
+    determines the response: the document, model, system prompt and
+    temperature.
+
+    Entries older than `max_age_days` are dropped, and once the cache holds
+    more than `max_entries` rows or `max_bytes` of JSON the least recently
+    used rows are evicted first.
+
+    The database is opened on first use, so creating a cache (as importing
+    ml_analysis does) touches no files.
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None, max_age_days=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        # Only used with self.lock held, so it is opened once.
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    value TEXT,
+                    size INTEGER,
+                    created REAL,
+                    accessed REAL
+                )""")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(content, model, system_prompt, temperature):
+        digest = hashlib.sha256()
+        for part in (content, model, system_prompt, repr(temperature)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key, value, model):
+        value_json = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value_json, len(value_json), now, now),
+            )
+            self.conn.commit()
+
+    def evict(self):
+        with self.lock:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                self.conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            if self.max_entries is not None:
+                self.conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed DESC
+                        LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                )
+            if self.max_bytes is not None:
+                self.conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY accessed DESC)
+                                AS running_size
+                            FROM responses
+                        ) WHERE running_size > ?
+                    )""",
+                    (self.max_bytes,),
+                )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
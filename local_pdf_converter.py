@@ -0,0 +1,223 @@
+import difflib
+import html
+import os
+import re
+import time
+
+import pdfplumber
+
+# How far (as a fraction of the font size) a rule may sit from a character's
+# baseline or middle and still count as its underline or strikethrough.
+UNDERLINE_BAND = (0.7, 1.25)
+STRIKE_BAND = (0.3, 0.75)
+
+# Rules thicker than this are boxes or shading, not text decoration.
+MAX_RULE_THICKNESS = 2.5
+
+LINE_TOLERANCE = 2
+
+
+def horizontal_rules(page):
+    """
+    Every thin horizontal stroke on the page as (x0, x1, y), whether the PDF
+    drew it as a line or as a filled rectangle.
+    """
+
+    rules = []
+    for line in page.lines:
+        if abs(line["top"] - line["bottom"]) <= MAX_RULE_THICKNESS:
+            rules.append((line["x0"], line["x1"], (line["top"] + line["bottom"]) / 2))
+    for rect in page.rects:
+        if rect["height"] <= MAX_RULE_THICKNESS and rect["width"] > 1:
+            rules.append((rect["x0"], rect["x1"], (rect["top"] + rect["bottom"]) / 2))
+    return rules
+
+
+def char_decoration(char, rules):
+    width = char["x1"] - char["x0"]
+    size = char["size"] or (char["bottom"] - char["top"])
+    for x0, x1, y in rules:
+        overlap = min(char["x1"], x1) - max(char["x0"], x0)
+        if overlap < width / 2:
+            continue
+        offset = (y - char["top"]) / size
+        if UNDERLINE_BAND[0] <= offset <= UNDERLINE_BAND[1]:
+            return "u"
+        if STRIKE_BAND[0] <= offset < STRIKE_BAND[1]:
+            return "s"
+    return None
+
+
+def group_lines(chars):
+    lines = []
+    for char in sorted(chars, key=lambda c: (round(c["top"]), c["x0"])):
+        if lines and abs(lines[-1][0]["top"] - char["top"]) <= LINE_TOLERANCE:
+            lines[-1].append(char)
+        else:
+            lines.append([char])
+    return [sorted(line, key=lambda c: c["x0"]) for line in lines]
+
+
+def drop_line_number(line):
+    """
+    Bills print line numbers in the left margin; drop a leading run of
+    digits that is set well apart from the text after it.
+    """
+
+    i = 0
+    while i < len(line) and line[i]["text"].isdigit():
+        if i and line[i]["x0"] - line[i - 1]["x1"] > line[i]["size"] * 0.15:
+            break
+        i += 1
+    if 0 < i < len(line) and line[i]["x0"] - line[i - 1]["x1"] > 2 * line[i]["size"]:
+        return line[i:]
+    return line
+
+
+def render_line(line, rules):
+    """
+    Text of one printed line with <u>/<s> around decorated runs, inserting
+    the spaces the PDF leaves implicit as gaps between glyphs.
+    """
+
+    rules = [
+        rule
+        for rule in rules
+        if line[0]["top"] - 2 <= rule[2] <= line[0]["bottom"] + line[0]["size"]
+    ]
+
+    parts = []
+    current_tag = None
+    previous = None
+    for char in line:
+        if previous is not None and char["x0"] - previous["x1"] > char["size"] * 0.15:
+            if previous["text"] != " " and char["text"] != " ":
+                parts.append(" ")
+        tag = char_decoration(char, rules) if char["text"].strip() else current_tag
+        if tag != current_tag:
+            if current_tag:
+                parts.append(f"</{current_tag}>")
+            if tag:
+                parts.append(f"<{tag}>")
+            current_tag = tag
+        parts.append(html.escape(char["text"], quote=False))
+        previous = char
+    if current_tag:
+        parts.append(f"</{current_tag}>")
+
+    text = "".join(parts)
+    text = re.sub(r"(\s+)</(u|s)>", r"</\2>\1", text)
+    text = re.sub(r"</(u|s)>(\s*)<\1>", r"\2", text)
+    text = re.sub(r"<(u|s)>(\s*)</\1>", r"\2", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def page_paragraphs(page):
+    """
+    Reassembles a page's printed lines into paragraphs: a new paragraph
+    starts at an indented line or after a line that stops well short of the
+    right margin.
+    """
+
+    lines = [drop_line_number(line) for line in group_lines(page.chars)]
+    lines = [line for line in lines if "".join(c["text"] for c in line).strip()]
+    if not lines:
+        return []
+
+    rules = horizontal_rules(page)
+    left = min(line[0]["x0"] for line in lines)
+    right = max(line[-1]["x1"] for line in lines)
+
+    paragraphs = []
+    previous_short = True
+    for line in lines:
+        size = line[0]["size"]
+        indented = line[0]["x0"] - left > size
+        text = render_line(line, rules)
+        if previous_short or indented or not paragraphs:
+            paragraphs.append(text)
+        else:
+            paragraphs[-1] += " " + text
+        previous_short = right - line[-1]["x1"] > 4 * size
+    return paragraphs
+
+
+def pdf_to_html_local(pdf_path):
+    """
+    Converts a bill PDF to HTML in the same shape docx_to_html_mammoth
+    produces (a flat run of <p> elements with <u> and <s> for inserted and
+    struck text), reading decorations straight from the PDF's drawing
+    operations instead of going through Adobe.
+    """
+
+    paragraphs = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            paragraphs.extend(page_paragraphs(page))
+            page.flush_cache()
+    return "".join(f"<p>{text}</p>" for text in paragraphs)
+
+
+def markup_text(html_content, tag):
+    return " ".join(
+        re.sub(r"<[^>]+>", "", match)
+        for match in re.findall(rf"<{tag}>(.*?)</{tag}>", html_content, re.S)
+    ).split()
+
+
+def plain_words(html_content):
+    return html.unescape(re.sub(r"<[^>]+>", " ", html_content)).split()
+
+
+def similarity(a, b):
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def parity_metrics(adobe_html, local_html):
+    """
+    Word-level agreement between an Adobe/mammoth conversion and a local
+    one: of the plain text, of the underlined text and of the struck text.
+    """
+
+    return {
+        "text_similarity": similarity(plain_words(adobe_html), plain_words(local_html)),
+        "underline_similarity": similarity(
+            markup_text(adobe_html, "u"), markup_text(local_html, "u")
+        ),
+        "strike_similarity": similarity(
+            markup_text(adobe_html, "s"), markup_text(local_html, "s")
+        ),
+        "adobe_words": len(plain_words(adobe_html)),
+        "local_words": len(plain_words(local_html)),
+    }
+
+
+def convert_pdf_local(input_pdf_path, output_html_path):
+    """
+    Process-pool entry point: converts one PDF and writes the HTML through
+    a temporary file, so a hard-linked copy from an earlier run is replaced
+    rather than overwritten. Never raises; returns (output_html_path,
+    seconds, error message or None).
+    """
+
+    start = time.perf_counter()
+    try:
+        html_content = pdf_to_html_local(input_pdf_path)
+        tmp_path = output_html_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        os.replace(tmp_path, output_html_path)
+        print(f"PDF converted to HTML locally: {output_html_path}")
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return output_html_path, time.perf_counter() - start, error
+
+
+def parity_row(input_pdf_path, adobe_html_path):
+    with open(adobe_html_path, "r", encoding="utf-8") as f:
+        adobe_html = f.read()
+    metrics = parity_metrics(adobe_html, pdf_to_html_local(input_pdf_path))
+    return {"local_pdf_path": input_pdf_path, **metrics}
@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Numeric event fields summed per stage and operation in the report.
+TOTALS = [
+    "retries",
+    "retry_wait",
+    "limiter_wait",
+    "bytes",
+    "tokens_in",
+    "tokens_out",
+]
+
+
+def metrics_path(datarun):
+    return os.path.join("Data", datarun, f"metrics_{datarun}.jsonl")
+
+
+class MetricsRecorder:
+    """
+    Appends one JSON line per instrumented call (a request, a conversion, a
+    cache lookup) to a run's metrics file. Events are dropped until
+    `configure` opens a file, and in forked worker processes, so stage code
+    can record unconditionally.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+
+    def configure(self, datarun):
+        path = metrics_path(datarun)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(path, "a", encoding="utf-8")
+            self.pid = os.getpid()
+
+    def record(self, stage, operation, seconds, start=None, error=None, **fields):
+        if self.file is None or os.getpid() != self.pid:
+            return
+        event = {
+            "time": start if start is not None else time.time() - seconds,
+            "stage": stage,
+            "operation": operation,
+            "seconds": seconds,
+            "ok": error is None,
+            "error": error,
+            **fields,
+        }
+        line = json.dumps(event, default=str) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+
+recorder = MetricsRecorder()
+
+
+def configure(datarun):
+    recorder.configure(datarun)
+
+
+def record(stage, operation, seconds, **fields):
+    recorder.record(stage, operation, seconds, **fields)
+
+
+@contextmanager
+def timed(stage, operation, **fields):
+    """
+    Records the duration of the block. The block can add fields (bytes,
+    tokens_in, limiter_wait, ...) to the yielded dict; an exception is
+    recorded as the event's error and re-raised.
+    """
+
+    event = dict(fields)
+    start = time.time()
+    began = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        record(stage, operation, time.perf_counter() - began, start=start, **event)
+
+
+def record_retry(stage, operation):
+    """
+    tenacity before_sleep hook recording each retry and its backoff.
+    """
+
+    def before_sleep(retry_state):
+        record(
+            stage,
+            operation,
+            0.0,
+            error=f"retry: {retry_state.outcome.exception()!r}",
+            retries=1,
+            retry_wait=retry_state.next_action.sleep,
+        )
+
+    return before_sleep
+
+
+def load_metrics(datarun):
+    # pandas is imported here, not at the top: every stage records metrics
+    # and most never read them back.
+    import pandas as pd
+
+    path = metrics_path(datarun)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    df = pd.read_json(path, orient="records", lines=True)
+    for column in TOTALS:
+        if column not in df:
+            df[column] = 0
+    df[TOTALS] = df[TOTALS].fillna(0)
+    return df
+
+
+def summarize(df):
+    """
+    Per stage and operation: call count, errors, latency percentiles,
+    throughput over the span the calls were made in, and the summed waits,
+    bytes and tokens.
+    """
+
+    import pandas as pd
+
+    # Retry markers carry waits and counts but are not calls themselves.
+    calls = df["retries"] == 0
+    rows = []
+    for (stage, operation), group in df.groupby(["stage", "operation"]):
+        done = group.loc[calls[group.index]]
+        seconds = done["seconds"]
+        span = (done["time"] + seconds).max() - done["time"].min()
+        rows.append(
+            {
+                "stage": stage,
+                "operation": operation,
+                "calls": len(done),
+                "errors": int((~done["ok"]).sum()),
+                "p50": seconds.quantile(0.5),
+                "p95": seconds.quantile(0.95),
+                "p99": seconds.quantile(0.99),
+                "max": seconds.max(),
+                "per_second": len(done) / span if span and span > 0 else None,
+                **{column: group[column].sum() for column in TOTALS},
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    import pandas as pd
+
+    argv = sys.argv[1:] if argv is None else argv
+    datarun = argv[0] if argv else os.getenv("DATARUN")
+    if datarun is None:
+        print("Usage: python metrics.py <DATARUN>")
+        return 1
+    metrics = load_metrics(datarun)
+    if metrics.empty:
+        print(f"No metrics recorded for {datarun}")
+        return 1
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(summarize(metrics).round(3).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
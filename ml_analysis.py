@@ -1,16 +1,19 @@
+import argparse
+import asyncio
+import email.utils
 import os
+import random
 import sys
 import json
-import openai
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_exponential,
-    retry_if_exception_type,
+    retry_if_exception,
 )
-from openai import APIError, RateLimitError, Timeout, APIConnectionError
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -19,62 +22,30 @@ from tenacity import (
     retry_if_exception_type,
 )
 
-from ratelimit import limits, sleep_and_retry
-
-
-def find_null_json_files(directory):
-    null_files = []
-
-    for filename in os.listdir(directory):
-        if filename.endswith(".json"):
-            filepath = os.path.join(directory, filename)
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    content = json.load(f)
-                    if content is None:
-                        null_files.append(os.path.join(directory, filename))
-            except json.JSONDecodeError:
-                print(f"Invalid JSON in file: {filename}")
-            except Exception as e:
-                print(f"Error reading file {filename}: {e}")
-
-    return null_files
-
-
-@retry(
-    retry=retry_if_exception_type(
-        (RateLimitError, APIError, Timeout, APIConnectionError)
-    ),
-    wait=wait_exponential(multiplier=1, min=4, max=60),
-    stop=stop_after_attempt(6),
-    reraise=True,
+import metrics
+from bill_text import chunk_bill_html, compact_bill_html, estimate_tokens
+from llm_cache import LLMCache
+from result_stream import (
+    ResultStream,
+    bill_record,
+    latest_index,
+    read_chunks,
+    stream_path,
+    write_ranked_outputs,
 )
-@sleep_and_retry
-@limits(calls=10, period=1)
-def analyze_legislation_html(local_html_path, model="gpt-4o"):
-    """
-    Reads an HTML file containing proposed legislation (with <u> and <s> tags
-    indicating additions/strikeouts) and sends it to the OpenAI ChatCompletion API.
-
-    The system prompt instructs the model to:
-      - Act as a legislative analyst,
-      - Return ONLY valid JSON listing potential constitutional issues,
-      - Use <u> and <s> tags to interpret text additions or deletions.
-
-    Returns a Python object parsed from the JSON response:
-      e.g., [ { "issue": "...", "references": "..." }, ... ]
-
-    If there are no issues, the model should return [].
-    """
+from rate_limiter import RequestTokenLimiter, TokenBucket
 
-    with open(local_html_path, "r", encoding="utf-8") as f:
-        html_content = f.read()
+# openai, pandas, bill_similarity (numpy) and the output modules
+# bill_store, search_index and bill_history (scipy, through issue_clusters)
+# are imported where they are used, so importing this module for its API,
+# or running a CLI subcommand that never analyzes, stays fast.
 
-    system_message = """
+SYSTEM_MESSAGE = """
 You are a legislative analyst. You will receive HTML text representing a proposed bill.
 Text that is being added to existing law is wrapped in <u>...</u>.
 Text that is being removed from existing law is wrapped in <s>...</s>.
 In some cases a new chapter is being added and and everything is an addition but nothing is wrapped in <u>...</u>.
+Runs of unchanged existing law may be omitted and replaced with [...].
 
 Your task:
 1) Identify potential constitutional issues with the proposed legislation.
@@ -102,110 +73,785 @@ Example:
 If there are no issues, return an empty array: []
 """
 
+TEMPERATURE = 0
+
+# Unchanged paragraphs kept on each side of an edit; None sends the full HTML.
+COMPACTION_CONTEXT = 2
+
+# Bills estimated above this many tokens are analyzed in section chunks.
+CHUNK_TOKENS = 30000
+
+# Chunks of one bill analyzed at the same time by analyze_legislation_html.
+CHUNK_CONCURRENCY = 4
+
+LLM_CACHE_PATH = os.path.join("Data", "llm_cache.sqlite")
+
+llm_cache = LLMCache(
+    LLM_CACHE_PATH,
+    max_bytes=512 * 1024 * 1024,
+    max_age_days=365,
+)
+
+# Paces the synchronous path (analyze_legislation_html) at 10 requests/second.
+request_limiter = TokenBucket(10)
+
+
+def read_bill_html(local_html_path, context_paragraphs=COMPACTION_CONTEXT):
+    """
+    Reads a bill's HTML and compacts it to its edits plus context, printing
+    the estimated token count before and after.
+    """
+
+    with open(local_html_path, "r", encoding="utf-8") as f:
+        html_content = f.read()
+
+    if context_paragraphs is None:
+        return html_content
+
+    compacted = compact_bill_html(html_content, context_paragraphs)
+    print(
+        f"{local_html_path}: {estimate_tokens(html_content)} -> "
+        f"{estimate_tokens(compacted)} tokens after compaction"
+    )
+    return compacted
+
+
+def build_messages(html_content):
     user_message = (
         "Analyze the following HTML legislative text for possible constitutional conflicts.\n"
         "Remember: return ONLY valid JSON with the described format.\n\n"
         f"HTML Document:\n{html_content}"
     )
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": user_message},
+    ]
 
-    try:
-        response = openai.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message},
-            ],
-            temperature=0,
-        )
-    except Exception as e:
-        print("Error calling OpenAI API:", e)
+
+def merge_issue_lists(results):
+    """
+    Combines the issue lists of a bill's chunks into one list, dropping
+    issues repeated with the same label and references. A failed chunk
+    fails the whole bill so the fallback pass picks it up.
+    """
+
+    if any(not isinstance(result, list) for result in results):
         return None
 
-    reply_content = response.choices[0].message.content
+    merged = []
+    seen = set()
+    for issues in results:
+        for issue in issues:
+            if isinstance(issue, dict):
+                key = (
+                    str(issue.get("issue", "")).strip().lower(),
+                    str(issue.get("references", "")).strip().lower(),
+                )
+                if key in seen:
+                    continue
+                seen.add(key)
+            merged.append(issue)
+    return merged
+
+
+# Outcome of analyzing one bill. Anything but OK goes to the fallback model
+# and, if that fails too, to the failed output.
+OK = "ok"
+NULL = "null"
+INVALID_JSON = "invalid_json"
+API_ERROR = "api_error"
+MISSING = "missing"
+
+
+def classify_reply(reply_content):
+    """
+    (status, issue list or None) for a model reply: INVALID_JSON if it does
+    not parse, NULL if it parses to anything but a list of issues.
+    """
 
     try:
         parsed_json = json.loads(reply_content)
-        return parsed_json
     except json.JSONDecodeError:
         print("OpenAI returned invalid JSON:\n", reply_content)
+        return INVALID_JSON, None
+    if not isinstance(parsed_json, list):
+        return NULL, None
+    return OK, parsed_json
+
+
+def transient_openai_error(error):
+    import openai
+
+    return isinstance(
+        error,
+        (
+            openai.RateLimitError,
+            openai.APIError,
+            openai.Timeout,
+            openai.APIConnectionError,
+        ),
+    )
+
+
+@retry(
+    retry=retry_if_exception(transient_openai_error),
+    wait=wait_exponential(multiplier=1, min=4, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
+def request_analysis(html_content, model):
+    """
+    Issue list of one request, or None if the reply is not a list of issues
+    (see classify_reply) or the call failed. Transient API errors are raised
+    so the decorator retries them.
+    """
+
+    import openai
+
+    limiter_wait = request_limiter.acquire()
+    with metrics.timed(
+        "analyze", "request", model=model, limiter_wait=limiter_wait
+    ) as event:
+        try:
+            response = openai.chat.completions.create(
+                model=model,
+                messages=build_messages(html_content),
+                temperature=TEMPERATURE,
+            )
+        except Exception as e:
+            print("Error calling OpenAI API:", e)
+            event["error"] = f"{type(e).__name__}: {e}"
+            if transient_openai_error(e):
+                raise
+            return None
+        record_usage(event, response)
+
+    _, issues = classify_reply(response.choices[0].message.content)
+    return issues
+
+
+def record_usage(event, response):
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        event["tokens_in"] = usage.prompt_tokens
+        event["tokens_out"] = usage.completion_tokens
+
+
+def analyze_html_content(html_content, model):
+    cache_key = LLMCache.make_key(html_content, model, SYSTEM_MESSAGE, TEMPERATURE)
+    cached = llm_cache.get(cache_key)
+    if isinstance(cached, list):
+        metrics.record("analyze", "cache_hit", 0.0, model=model)
+        return cached
+
+    try:
+        issues = request_analysis(html_content, model)
+    except Exception as e:
+        print(f"Giving up on OpenAI after retries: {e}")
+        return None
+    if issues is not None:
+        llm_cache.set(cache_key, issues, model)
+    return issues
+
+
+def analyze_legislation_html(
+    local_html_path, model="gpt-4o", context_paragraphs=COMPACTION_CONTEXT
+):
+    """
+    Reads an HTML file containing proposed legislation (with <u> and <s> tags
+    indicating additions/strikeouts) and sends it to the OpenAI ChatCompletion API.
+
+    The system prompt instructs the model to:
+      - Act as a legislative analyst,
+      - Return ONLY valid JSON listing potential constitutional issues,
+      - Use <u> and <s> tags to interpret text additions or deletions.
+
+    Returns a Python object parsed from the JSON response:
+      e.g., [ { "issue": "...", "references": "..." }, ... ]
+
+    If there are no issues, the model should return [].
+
+    Unchanged law around the edits is compacted away first (see
+    compact_bill_html); pass context_paragraphs=None to send the full HTML.
+    Bills still larger than CHUNK_TOKENS are split along section boundaries,
+    the chunks analyzed concurrently and their issue lists merged.
+
+    Successful responses are cached on a hash of the HTML, model, system
+    prompt and temperature, so an unchanged bill is never sent twice.
+    """
+
+    html_content = read_bill_html(local_html_path, context_paragraphs)
+    chunks = chunk_bill_html(html_content, CHUNK_TOKENS)
+    if len(chunks) == 1:
+        return analyze_html_content(html_content, model)
+
+    print(f"{local_html_path}: analyzing in {len(chunks)} chunks")
+    with ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY) as executor:
+        results = list(
+            executor.map(lambda chunk: analyze_html_content(chunk, model), chunks)
+        )
+    return merge_issue_lists(results)
+
+
+# Room left for the JSON reply when estimating a request's token cost.
+EXPECTED_COMPLETION_TOKENS = 1000
+
+MAX_ATTEMPTS = 6
+
+
+def retry_after_seconds(error):
+    """
+    Seconds the server asked us to wait, from the retry-after-ms or
+    retry-after header of a failed response, or None if it did not say or
+    the header is malformed.
+    """
+
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = response.headers.get("retry-after")
+    if not retry_after:
         return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+async def request_analysis_async(client, limiter, html_content, model):
+    """
+    (status, issue list or None) for one request, see classify_reply.
+    Failed calls that retries cannot fix are API_ERROR.
+    """
+
+    import openai
+
+    messages = build_messages(html_content)
+    estimated_tokens = (
+        sum(estimate_tokens(m["content"]) for m in messages)
+        + EXPECTED_COMPLETION_TOKENS
+    )
+
+    for attempt in range(MAX_ATTEMPTS):
+        limiter_wait = await limiter.acquire(estimated_tokens)
+        start = time.time()
+        began = time.perf_counter()
+
+        def record_attempt(error, **fields):
+            metrics.record(
+                "analyze",
+                "request",
+                time.perf_counter() - began,
+                start=start,
+                error=error,
+                model=model,
+                limiter_wait=limiter_wait,
+                **fields,
+            )
+
+        try:
+            response = await client.chat.completions.create(
+                model=model, messages=messages, temperature=TEMPERATURE
+            )
+        except (
+            openai.RateLimitError,
+            openai.InternalServerError,
+            openai.APIConnectionError,
+        ) as e:
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = min(60, 4 * 2**attempt) * (0.5 + random.random() / 2)
+            print(f"OpenAI request failed ({e}), retrying in {delay:.1f}s")
+            record_attempt(f"{type(e).__name__}: {e}")
+            metrics.record(
+                "analyze", "request", 0.0, error="retry", retries=1, retry_wait=delay
+            )
+            await asyncio.sleep(delay)
+            continue
+        except Exception as e:
+            print("Error calling OpenAI API:", e)
+            record_attempt(f"{type(e).__name__}: {e}")
+            return API_ERROR, None
+
+        usage = {}
+        record_usage(usage, response)
+        status, data = classify_reply(response.choices[0].message.content)
+        record_attempt(None if status == OK else status, status=status, **usage)
+        return status, data
+
+    print(f"Giving up after {MAX_ATTEMPTS} attempts")
+    return API_ERROR, None
+
+
+async def analyze_html_content_async(client, limiter, html_content, model):
+    cache_key = LLMCache.make_key(html_content, model, SYSTEM_MESSAGE, TEMPERATURE)
+    cached = llm_cache.get(cache_key)
+    # Older versions of the synchronous path also cached replies that were
+    # not lists; those are analyzed again.
+    if isinstance(cached, list):
+        metrics.record("analyze", "cache_hit", 0.0, model=model)
+        return OK, cached
+
+    status, parsed_json = await request_analysis_async(
+        client, limiter, html_content, model
+    )
+    if status == OK:
+        llm_cache.set(cache_key, parsed_json, model)
+    return status, parsed_json
+
+
+async def analyze_legislation_html_async(
+    client, limiter, local_html_path, model, context_paragraphs=COMPACTION_CONTEXT
+):
+    """
+    Async counterpart of analyze_legislation_html that shares its cache, but
+    paces itself with `limiter` and retries each request on its own,
+    honoring the server's Retry-After. Returns (status, issue list or None);
+    a chunked bill takes the status of its first failed chunk.
+    """
+
+    html_content = read_bill_html(local_html_path, context_paragraphs)
+    chunks = chunk_bill_html(html_content, CHUNK_TOKENS)
+    if len(chunks) == 1:
+        return await analyze_html_content_async(client, limiter, html_content, model)
+
+    print(f"{local_html_path}: analyzing in {len(chunks)} chunks")
+    results = await asyncio.gather(
+        *(analyze_html_content_async(client, limiter, c, model) for c in chunks)
+    )
+    for status, _ in results:
+        if status != OK:
+            return status, None
+    return OK, merge_issue_lists([issues for _, issues in results])
+
+
+async def analyze_bills(
+    pdf_paths,
+    model,
+    concurrency,
+    limiter,
+    context_paragraphs=COMPACTION_CONTEXT,
+    on_result=None,
+):
+    """
+    Analyzes every bill with at most `concurrency` requests in flight and
+    writes each bill's .json as soon as its response arrives, also handing
+    it to `on_result(local_pdf_path, status, issue_data)` if given. Returns
+    {local_pdf_path: status}; the issue lists are not kept.
+    """
+
+    import openai
+
+    client = openai.AsyncOpenAI(max_retries=0)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze_bill(input_pdf_path):
+        async with semaphore:
+            print("processing {input_pdf_path}".format(input_pdf_path=input_pdf_path))
+            input_html_path = input_pdf_path.replace(".pdf", ".html")
+            with metrics.timed(
+                "analyze", "bill", item=input_html_path, model=model
+            ) as event:
+                try:
+                    status, issue_data = await analyze_legislation_html_async(
+                        client, limiter, input_html_path, model, context_paragraphs
+                    )
+                except OSError as e:
+                    print(f"Could not read {input_html_path}: {e}")
+                    status, issue_data = MISSING, None
+                event["status"] = status
+                if status != OK:
+                    event["error"] = status
+        output_json_path = input_pdf_path.replace(".pdf", ".json")
+        with open(output_json_path, "w") as f:
+            json.dump(issue_data, f, indent=4)
+        if on_result is not None:
+            on_result(input_pdf_path, status, issue_data)
+        return input_pdf_path, status
+
+    try:
+        return dict(await asyncio.gather(*(analyze_bill(p) for p in pdf_paths)))
+    finally:
+        await client.close()
+
+
+# Estimated Jaccard similarity of their word 5-grams from which a bill counts
+# as a near-duplicate (companion or trailer bill) of an earlier one.
+REUSE_THRESHOLD = 0.9
+
+
+def reuse_analyses(duplicates, on_result=None):
+    """
+    Copies the analyses of near-duplicate bills from their sources.
+    `duplicates` maps a bill's local_pdf_path to (its source's
+    local_pdf_path, similarity). Only a bill whose preamble and sections all
+    appear byte for byte in its source takes the source's issues; a bill
+    without SECTION headings is one part. Writes each bill's .json and hands
+    it to `on_result` like analyze_bills. Returns {local_pdf_path: status}
+    for the bills it reused; the others, including bills whose text differs
+    (the source's issues may come from a part they changed or dropped) and
+    bills whose source has no usable analysis, are left out for the normal
+    passes.
+    """
+
+    import bill_similarity
+
+    results = {}
+    for input_pdf_path, (source_pdf_path, similarity) in duplicates.items():
+        source_status, source_issues = load_outcome(source_pdf_path)
+        if source_status != OK:
+            continue
 
+        input_html_path = input_pdf_path.replace(".pdf", ".html")
+        with metrics.timed(
+            "analyze", "reuse", item=input_html_path, similarity=similarity
+        ) as event:
+            try:
+                _, parts = bill_similarity.differing_sections(
+                    bill_similarity.read_html(input_html_path),
+                    bill_similarity.read_html(source_pdf_path.replace(".pdf", ".html")),
+                )
+            except OSError as e:
+                print(f"Could not read {input_html_path}: {e}")
+                continue
+            event["sections"] = len(parts)
+            event["status"] = OK if not parts else "differs"
+        if parts:
+            print(
+                f"{input_pdf_path}: {similarity:.2f} similar to {source_pdf_path}, "
+                f"{len(parts)} differing parts; analyzed in full"
+            )
+            continue
+
+        print(f"{input_pdf_path}: same text as {source_pdf_path}, analysis reused")
+        with open(input_pdf_path.replace(".pdf", ".json"), "w") as f:
+            json.dump(source_issues, f, indent=4)
+        if on_result is not None:
+            on_result(input_pdf_path, OK, source_issues)
+        results[input_pdf_path] = OK
+    return results
+
+
+parser = argparse.ArgumentParser(description="Analyze bills with OpenAI")
+parser.add_argument(
+    "--concurrency", type=int, default=8, help="number of requests kept in flight"
+)
+parser.add_argument(
+    "--rpm", type=int, default=500, help="OpenAI requests per minute limit"
+)
+parser.add_argument(
+    "--tpm", type=int, default=450000, help="OpenAI tokens per minute limit"
+)
+parser.add_argument(
+    "--context",
+    type=int,
+    default=COMPACTION_CONTEXT,
+    help="unchanged paragraphs kept around each edit when compacting bills",
+)
+parser.add_argument(
+    "--full-text",
+    action="store_true",
+    help="send the full bill HTML instead of compacting it",
+)
+parser.add_argument(
+    "--batch",
+    action="store_true",
+    help="send the first pass through the OpenAI Batch API (half price, "
+    "results within 24h); bills that fail there are retried interactively",
+)
+parser.add_argument(
+    "--poll",
+    type=float,
+    default=60,
+    help="seconds between batch status checks",
+)
+parser.add_argument(
+    "--reuse-threshold",
+    type=float,
+    default=REUSE_THRESHOLD,
+    help="estimated similarity from which a bill reuses an earlier bill's "
+    "analysis (default %(default)s)",
+)
+parser.add_argument(
+    "--no-reuse",
+    action="store_true",
+    help="analyze every bill in full, even near-duplicates",
+)
 
-datarun = os.getenv("DATARUN")
 
-if datarun is None:
-    print("You need to set the DATARUN environment variable")
-    sys.exit(1)
+# Tried in order; a bill whose analysis fails with one model goes to the next.
+ANALYSIS_MODELS = ["gpt-4o", "gpt-4o-mini"]
 
-df = pd.read_csv("Data/{datarun}/idaho_bills_{datarun}.csv".format(datarun=datarun))
 
-for input_pdf_path in df["local_pdf_path"]:
-    print("processing {input_pdf_path}".format(input_pdf_path=input_pdf_path))
-    input_html_path = input_pdf_path.replace(".pdf", ".html")
-    issue_data = analyze_legislation_html(input_html_path)
-    output_json_path = input_pdf_path.replace(".pdf", ".json")
-    with open(output_json_path, "w") as f:
-        json.dump(issue_data, f, indent=4)
+def status_ledger_path(datarun):
+    return os.path.join("Data", datarun, f"analysis_status_{datarun}.csv")
 
 
-# Find list of failed analyses
-directory_path = "Data/{datarun}".format(datarun=datarun)
-null_file_list = find_null_json_files(directory_path)
-print("Files with null content:", null_file_list)
+def analyze_run(
+    df,
+    datarun,
+    concurrency,
+    limiter,
+    context_paragraphs,
+    batch=False,
+    poll_seconds=60,
+    reuse_threshold=REUSE_THRESHOLD,
+):
+    """
+    Analyzes every bill of a run with the first model, then retries the
+    failures with the fallback model. With `batch`, the first pass goes
+    through the Batch API (see batch_analysis) and only the bills that fail
+    there take the interactive passes. With a `reuse_threshold`, bills at
+    least that similar to an earlier bill of the run (see bill_similarity)
+    wait for that bill and reuse its analysis if their text is the same;
+    otherwise they take the normal passes. Each
+    result is appended to the run's result stream as it arrives (see
+    result_stream), so partial results are on disk and viewable while the
+    run goes on. Returns {local_pdf_path: status} and writes each bill's
+    final status and model to the run's status ledger.
+    """
 
-pdf_paths = [p.replace(".json", ".pdf") for p in null_file_list]
-un_analyzed_df = df[df["local_pdf_path"].isin(pdf_paths)]
+    import bill_similarity
+    import pandas as pd
+
+    bills = df.set_index("local_pdf_path", drop=False)
+    # Appended to, not replaced: a crashed run's results stay until a bill
+    # is analyzed again, whose newer record then wins (see latest_index).
+    stream = ResultStream(stream_path(datarun))
+
+    def on_result(pdf_path, status, issue_data):
+        stream.write(bill_record(bills.loc[pdf_path], status, issue_data))
+
+    statuses = {}
+    models = {}
+
+    def run_passes(pending, use_batch):
+        if use_batch:
+            # Imported here: batch_analysis builds on this module.
+            import batch_analysis
+
+            model = ANALYSIS_MODELS[0]
+            results = batch_analysis.analyze_batch(
+                bills.loc[pending],
+                datarun,
+                model,
+                context_paragraphs,
+                on_result,
+                poll_seconds,
+            )
+            statuses.update(results)
+            models.update(dict.fromkeys(results, f"{model} (batch)"))
+            pending = [path for path, status in results.items() if status != OK]
+            print(f"batch: {len(results) - len(pending)} of {len(results)} analyzed")
+
+        for model in ANALYSIS_MODELS:
+            if not pending:
+                break
+            results = asyncio.run(
+                analyze_bills(
+                    pending, model, concurrency, limiter, context_paragraphs, on_result
+                )
+            )
+            statuses.update(results)
+            models.update(dict.fromkeys(results, model))
+            pending = [path for path, status in results.items() if status != OK]
+            print(f"{model}: {len(results) - len(pending)} of {len(results)} analyzed")
+        return pending
+
+    duplicates = {}
+    if reuse_threshold is not None:
+        index = bill_similarity.build_index(df)
+        index.save(bill_similarity.index_path(datarun))
+        path_of = dict(zip(df["bill_number"], df["local_pdf_path"]))
+        duplicates = {
+            path_of[bill_number]: (path_of[source], similarity)
+            for bill_number, (source, similarity) in bill_similarity.plan_reuse(
+                index, df["bill_number"], reuse_threshold
+            ).items()
+        }
+        print(f"{len(duplicates)} near-duplicate bills may reuse an analysis")
 
-for input_pdf_path in un_analyzed_df["local_pdf_path"]:
-    print("processing {input_pdf_path}".format(input_pdf_path=input_pdf_path))
-    input_html_path = input_pdf_path.replace(".pdf", ".html")
-    issue_data = analyze_legislation_html(input_html_path, model="gpt-4o-mini")
-    output_json_path = input_pdf_path.replace(".pdf", ".json")
-    with open(output_json_path, "w") as f:
-        json.dump(issue_data, f, indent=4)
+    try:
+        pending = run_passes(
+            [path for path in df["local_pdf_path"] if path not in duplicates], batch
+        )
+        if duplicates:
+            results = reuse_analyses(duplicates, on_result)
+            statuses.update(results)
+            for path in results:
+                source_model = models[duplicates[path][0]]
+                models[path] = f"{source_model} (reused)"
+            print(f"reuse: {len(results)} of {len(duplicates)} reused")
+            pending += run_passes(
+                [path for path in duplicates if path not in results], False
+            )
+    finally:
+        stream.close()
+
+    status_df = pd.DataFrame(
+        {
+            "bill_number": df["bill_number"],
+            "local_pdf_path": df["local_pdf_path"],
+            "status": [statuses[path] for path in df["local_pdf_path"]],
+            "model": [models[path] for path in df["local_pdf_path"]],
+        }
+    )
+    status_df.to_csv(status_ledger_path(datarun), index=False)
+    print("Analysis status:", status_df["status"].value_counts().to_dict())
+    if pending:
+        print("Not analyzed:", pending)
 
+    llm_cache.evict()
+    print("LLM cache:", llm_cache.stats())
+    return statuses
 
-null_file_list = find_null_json_files(directory_path)
-print("Files with null content:", null_file_list)
 
+def load_outcome(pdf_path_str):
+    """
+    (status, issue list or None) of a bill from its .json, for bills with no
+    record in the result stream.
+    """
 
-def load_json_data(pdf_path_str):
     json_path = Path(pdf_path_str).with_suffix(".json")
     try:
         with open(json_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            json_data = json.load(f)
     except FileNotFoundError:
-        return None
+        return MISSING, None
     except json.JSONDecodeError:
-        return {"error": "Invalid JSON"}
+        return INVALID_JSON, None
+    if not isinstance(json_data, list):
+        return NULL, None
+    return OK, json_data
+
 
+def enriched_path(datarun):
+    return os.path.join("Data", f"idaho_bills_enriched_{datarun}.jsonl")
 
-df["json_data"] = df["local_pdf_path"].apply(load_json_data)
 
-none_df = df.loc[df["json_data"].isna()].copy()
+def failed_path(datarun):
+    return os.path.join("Data", f"idaho_bills_failed_{datarun}.jsonl")
 
-issues_df = df.loc[df["json_data"].apply(lambda x: isinstance(x, list))].copy()
 
-issues_df["issue_count"] = issues_df["json_data"].apply(len)
-none_df["issue_count"] = 0
+def write_outputs(df, datarun):
+    """
+    Turns the run's result stream into the ranked enriched and the failed
+    JSONL files, then writes the Parquet store and search index from the
+    ranked file, adds the run to the history store, and writes the bills'
+    similarity index. The ranked file is read one chunk of bills at a time
+    for each output, so memory stays flat however large the run. Bills of
+    `df` with no
+    record in the stream (analyzed by an older version of this script) are
+    added to it from their .json.
+    """
 
+    import bill_history
+    import bill_similarity
+    from bill_store import write_store
+    from search_index import build_search_index
 
-issues_df_sorted = issues_df.sort_values(by="issue_count", ascending=False).reset_index(
-    drop=True
-)
+    path = stream_path(datarun)
+    streamed = set(latest_index(path))
+    stream = ResultStream(path)
+    try:
+        for bill in df.to_dict("records"):
+            if bill["bill_number"] not in streamed:
+                status, issue_data = load_outcome(bill["local_pdf_path"])
+                stream.write(bill_record(bill, status, issue_data))
+    finally:
+        stream.close()
+
+    # For the dashboard's similar-bills list, also on runs analyzed without
+    # reuse or through pipeline.py.
+    bill_similarity.build_index(df).save(bill_similarity.index_path(datarun))
+
+    enriched, failed = write_ranked_outputs(
+        path, enriched_path(datarun), failed_path(datarun)
+    )
+    print(f"{enriched} bills analyzed, {failed} failed")
 
-issues_df_sorted.to_json(
-    os.path.join(
-        "Data", "idaho_bills_enriched_{datarun}.jsonl".format(datarun=datarun)
-    ),
-    index=False,
-    orient="records",
-    lines=True,
-)
+    if not enriched:
+        return
+    write_store(enriched_path(datarun), datarun)
+    build_search_index(read_chunks(enriched_path(datarun)), datarun)
+    conn = bill_history.connect()
+    try:
+        bill_history.ingest_run(conn, read_chunks(enriched_path(datarun)), datarun)
+    finally:
+        conn.close()
+
+
+def analyze_datarun(
+    datarun,
+    concurrency=8,
+    rpm=500,
+    tpm=450000,
+    context_paragraphs=COMPACTION_CONTEXT,
+    batch=False,
+    poll_seconds=60,
+    reuse_threshold=REUSE_THRESHOLD,
+):
+    """
+    Analyzes the bills of a scraped and converted run and writes its
+    outputs. Returns {local_pdf_path: status}.
+    """
 
-none_df.to_json(
-    os.path.join("data", "idaho_bills_failed_{datarun}.jsonl".format(datarun=datarun)),
-    index=False,
-    orient="records",
-    lines=True,
-)
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join("Data", datarun, f"idaho_bills_{datarun}.csv"))
+    metrics.configure(datarun)
+
+    # One limiter for both passes so the fallback cannot overrun the budget.
+    limiter = RequestTokenLimiter(rpm, tpm)
+
+    statuses = analyze_run(
+        df,
+        datarun,
+        concurrency,
+        limiter,
+        context_paragraphs,
+        batch=batch,
+        poll_seconds=poll_seconds,
+        reuse_threshold=reuse_threshold,
+    )
+    write_outputs(df, datarun)
+    return statuses
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    datarun = os.getenv("DATARUN")
+
+    if datarun is None:
+        print("You need to set the DATARUN environment variable")
+        return 1
+
+    analyze_datarun(
+        datarun,
+        args.concurrency,
+        args.rpm,
+        args.tpm,
+        None if args.full_text else args.context,
+        batch=args.batch,
+        poll_seconds=args.poll,
+        reuse_threshold=None if args.no_reuse else args.reuse_threshold,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
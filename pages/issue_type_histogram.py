@@ -5,31 +5,25 @@ import plotly.express as px
 import os
 from pathlib import Path
 
-from utils import load_data
+from utils import load_aggregates, select_run
 
-df = load_data()
+select_run()
+aggregates = load_aggregates()
 
 st.title("Distribution of Constitutional Issue Types")
 
-# Flatten and count
-all_issues = [
-    issue.get("issue")
-    for issues in df["json_data"]
-    if isinstance(issues, list)
-    for issue in issues
-    if issue.get("issue")
-]
-if not all_issues:
+# Issue-type counts, precomputed once per DATARUN. Near-duplicate labels
+# ("First Amendment concern", "First Amendment Concerns") are merged unless
+# the user asks for the labels exactly as the model wrote them.
+merge_labels = st.checkbox("Merge near-duplicate issue labels", value=True)
+if merge_labels:
+    issue_counts = aggregates.issue_type_counts
+else:
+    issue_counts = aggregates.raw_issue_type_counts
+if issue_counts.empty:
     st.info("No issues data to plot.")
     st.stop()
 
-issue_counts = (
-    pd.Series(all_issues)
-    .value_counts()
-    .reset_index()
-    .rename(columns={"index": "issue_type", 0: "count"})
-)
-
 # Let user choose how many to display
 max_n = len(issue_counts)
 top_n = st.slider(
@@ -2,22 +2,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils import load_data
+from utils import load_aggregates, select_run
 
 # Load and prepare
-df = load_data()
+select_run()
+aggregates = load_aggregates()
 
 st.title("Constitutional Issues by Sponsor")
 
-# Compute total issues per sponsor
-# df.issue_count counts per bill; sum across bills grouped by sponsor
-issues_by_sponsor = (
-    df.groupby("sponsor")["issue_count"]
-    .sum()
-    .reset_index()
-    .rename(columns={"issue_count": "total_issues"})
-    .sort_values("total_issues", ascending=False)
-)
+# Total issues per sponsor, precomputed once per DATARUN
+issues_by_sponsor = aggregates.sponsor_totals
 
 if issues_by_sponsor["total_issues"].sum() == 0:
     st.info("No issues detected for any sponsor.")
@@ -0,0 +1,74 @@
+# pages/performance.py
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from metrics import summarize
+from utils import load_metrics, select_run
+
+select_run()
+st.title("Run Performance")
+
+events = load_metrics()
+if events.empty:
+    st.info(
+        "No metrics recorded for this run. They are written by scrape.py, "
+        "pdf_to_html.py, ml_analysis.py and pipeline.py."
+    )
+    st.stop()
+
+stages = sorted(events["stage"].unique())
+chosen = st.multiselect("Stages", stages, default=stages)
+events = events[events["stage"].isin(chosen)]
+if events.empty:
+    st.stop()
+
+summary = summarize(events)
+st.subheader("Per operation")
+st.dataframe(
+    summary.round(3),
+    hide_index=True,
+    column_config={
+        "p50": "p50 (s)",
+        "p95": "p95 (s)",
+        "p99": "p99 (s)",
+        "max": "max (s)",
+        "per_second": "calls/s",
+        "retry_wait": "retry wait (s)",
+        "limiter_wait": "limiter wait (s)",
+    },
+)
+
+# Retry markers are bookkeeping, not calls with a latency of their own.
+calls = events[events["retries"] == 0].copy()
+calls["operation"] = calls["stage"] + " / " + calls["operation"]
+
+st.subheader("Latency")
+fig = px.box(
+    calls,
+    x="seconds",
+    y="operation",
+    orientation="h",
+    points=False,
+    labels={"seconds": "Seconds", "operation": "Operation"},
+)
+fig.update_layout(height=40 * calls["operation"].nunique() + 150)
+st.plotly_chart(fig, use_container_width=True)
+
+st.subheader("Throughput")
+calls["finished"] = pd.to_datetime(calls["time"] + calls["seconds"], unit="s")
+throughput = (
+    calls.groupby(["operation", pd.Grouper(key="finished", freq="10s")])
+    .size()
+    .rename("calls")
+    .reset_index()
+)
+throughput["calls/s"] = throughput["calls"] / 10
+fig = px.line(
+    throughput,
+    x="finished",
+    y="calls/s",
+    color="operation",
+    labels={"finished": "Time (UTC)", "operation": "Operation"},
+)
+st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,77 @@
+# pages/trends.py
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from utils import list_runs, history_version, load_history, load_sponsor_trend
+
+st.title("Issue Trends Across Runs")
+
+runs = list_runs(history_version())
+if runs.empty:
+    st.info(
+        "The history store is empty. Runs are added to it when ml_analysis.py "
+        "or pipeline.py finishes; add older runs with `python bill_history.py`."
+    )
+    st.stop()
+
+sessions = sorted(runs["session"].unique(), reverse=True)
+session = st.selectbox("Session", sessions, index=0)
+session_runs = runs[runs["session"] == session]
+st.caption(f"{len(session_runs)} runs of the {session} session")
+if len(session_runs) < 2:
+    st.info("This session has only one run so far, so there is no trend yet.")
+
+st.subheader("Issues per Sponsor")
+sponsors = load_sponsor_trend(session)
+latest = sponsors[sponsors["datarun"] == session_runs["datarun"].iloc[0]]
+top_n = st.slider("Sponsors with the most issues in the latest run", 3, 25, 10)
+top_sponsors = latest.nlargest(top_n, "total_issues")["sponsor"]
+fig = px.line(
+    sponsors[sponsors["sponsor"].isin(top_sponsors)].sort_values("run_date"),
+    x="run_date",
+    y="total_issues",
+    color="sponsor",
+    markers=True,
+    labels={"total_issues": "Total Issues", "run_date": "Run"},
+)
+st.plotly_chart(fig, use_container_width=True)
+
+st.subheader("Issues per Bill")
+history = load_history(
+    session, columns=["datarun", "bill_number", "bill_title", "issue_count"]
+)
+run_order = session_runs.sort_values(["run_date", "datarun"])["datarun"]
+counts = history.pivot_table(
+    index="bill_number", columns="datarun", values="issue_count"
+).reindex(columns=run_order)
+changes = pd.DataFrame(
+    {
+        "first": counts.bfill(axis=1).iloc[:, 0],
+        "latest": counts.ffill(axis=1).iloc[:, -1],
+        "fewest": counts.min(axis=1),
+        "most": counts.max(axis=1),
+        "runs": counts.notna().sum(axis=1),
+    }
+)
+changes["change"] = changes["latest"] - changes["first"]
+spread = (changes["most"] - changes["fewest"]).sort_values(ascending=False)
+changes = changes.loc[spread[spread > 0].index]
+st.caption(f"{len(changes)} bills whose issue count changed between runs")
+st.dataframe(changes, use_container_width=True)
+
+bill_options = sorted(counts.index)
+chosen = st.multiselect(
+    "Bills", bill_options, default=list(changes.index[:5]), max_selections=20
+)
+if chosen:
+    fig = px.line(
+        history[history["bill_number"].isin(chosen)].sort_values("run_date"),
+        x="run_date",
+        y="issue_count",
+        color="bill_number",
+        markers=True,
+        hover_data=["bill_title"],
+        labels={"issue_count": "Issues", "run_date": "Run"},
+    )
+    st.plotly_chart(fig, use_container_width=True)
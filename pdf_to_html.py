@@ -1,122 +1,465 @@
+import argparse
+import hashlib
+import json
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
-import mammoth
-import pandas as pd
 import sys
 
-from adobe.pdfservices.operation.auth.service_principal_credentials import (
-    ServicePrincipalCredentials,
-)
-from adobe.pdfservices.operation.exception.exceptions import (
-    ServiceApiException,
-    ServiceUsageException,
-    SdkException,
-)
-from adobe.pdfservices.operation.io.cloud_asset import CloudAsset
-from adobe.pdfservices.operation.io.stream_asset import StreamAsset
-from adobe.pdfservices.operation.pdf_services import PDFServices
-from adobe.pdfservices.operation.pdf_services_media_type import PDFServicesMediaType
-from adobe.pdfservices.operation.pdfjobs.jobs.export_pdf_job import ExportPDFJob
-from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_params import (
-    ExportPDFParams,
-)
-from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_target_format import (
-    ExportPDFTargetFormat,
-)
-from adobe.pdfservices.operation.pdfjobs.result.export_pdf_result import ExportPDFResult
-
-from ratelimit import limits, sleep_and_retry
+import metrics
+from rate_limiter import TokenBucket
 
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_fixed,
     RetryError,
-    retry_if_exception_type,
+    retry_if_exception,
 )
 
+# The Adobe SDK, pandas, pdfplumber and mammoth are imported by the code
+# that uses them, so importing this module (or pipeline.py) for one backend
+# does not pay for the other, and the CLI starts quickly.
+
+# Set up by configure(); PDF Services is only created for the adobe backend.
+rate_limiter = TokenBucket(10)
+pdf_services = None
+
+
+def configure(backend="adobe", rate=10):
+    global rate_limiter, pdf_services
+    rate_limiter = TokenBucket(rate)
+    if backend == "adobe" and pdf_services is None:
+        from adobe.pdfservices.operation.auth.service_principal_credentials import (
+            ServicePrincipalCredentials,
+        )
+        from adobe.pdfservices.operation.pdf_services import PDFServices
+
+        credentials = ServicePrincipalCredentials(
+            client_id=os.getenv("PDF_SERVICES_CLIENT_ID"),
+            client_secret=os.getenv("PDF_SERVICES_CLIENT_SECRET"),
+        )
+        pdf_services = PDFServices(credentials=credentials)
+
+
+def sdk_error(error):
+    from adobe.pdfservices.operation.exception.exceptions import SdkException
+
+    return isinstance(error, SdkException)
+
 
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_fixed(1),
-    retry=retry_if_exception_type(SdkException),
+    retry=retry_if_exception(sdk_error),
+    before_sleep=metrics.record_retry("convert", "export"),
 )
-@sleep_and_retry
-@limits(calls=10, period=1)
 def pdf_to_docx(input_stream):
-    input_asset = pdf_services.upload(
-        input_stream=input_stream, mime_type=PDFServicesMediaType.PDF
+    from adobe.pdfservices.operation.pdf_services_media_type import (
+        PDFServicesMediaType,
+    )
+    from adobe.pdfservices.operation.pdfjobs.jobs.export_pdf_job import ExportPDFJob
+    from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_params import (
+        ExportPDFParams,
+    )
+    from adobe.pdfservices.operation.pdfjobs.params.export_pdf.export_pdf_target_format import (
+        ExportPDFTargetFormat,
+    )
+    from adobe.pdfservices.operation.pdfjobs.result.export_pdf_result import (
+        ExportPDFResult,
     )
 
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed(
+        "convert", "upload", bytes=len(input_stream), limiter_wait=limiter_wait
+    ) as event:
+        input_asset = pdf_services.upload(
+            input_stream=input_stream, mime_type=PDFServicesMediaType.PDF
+        )
+
     export_pdf_params = ExportPDFParams(target_format=ExportPDFTargetFormat.DOCX)
 
     export_pdf_job = ExportPDFJob(
         input_asset=input_asset, export_pdf_params=export_pdf_params
     )
 
-    location = pdf_services.submit(export_pdf_job)
-    pdf_services_response = pdf_services.get_job_result(location, ExportPDFResult)
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed("convert", "submit", limiter_wait=limiter_wait) as event:
+        location = pdf_services.submit(export_pdf_job)
+    # get_job_result polls until the export finishes, so this is queue time.
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed("convert", "poll", limiter_wait=limiter_wait) as event:
+        pdf_services_response = pdf_services.get_job_result(location, ExportPDFResult)
+
+    result_asset = pdf_services_response.get_result().get_asset()
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed("convert", "download", limiter_wait=limiter_wait) as event:
+        stream_asset = pdf_services.get_content(result_asset)
+        output_stream = stream_asset.get_input_stream()
+        event["bytes"] = len(output_stream)
+
+    return output_stream
+
+
+def write_atomic(path, data):
+    """
+    Writes via a temporary file and rename. Besides never leaving a half
+    written file behind, this replaces rather than overwrites files that
+    scrape.py hard-linked from an earlier run.
+    """
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """
+    Maps the sha256 of a source PDF to the sha256 of the .docx and .html
+    produced from it. Keyed on content rather than path, so outputs that
+    scrape.py linked in from a previous run folder are recognised too.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def is_current(self, pdf_sha256, kind, output_path):
+        with self.lock:
+            expected = self.entries.get(pdf_sha256, {}).get(kind)
+        return (
+            expected is not None
+            and os.path.exists(output_path)
+            and file_sha256(output_path) == expected
+        )
+
+    def record(self, pdf_sha256, kind, output_path):
+        output_sha256 = file_sha256(output_path)
+        with self.lock:
+            self.entries.setdefault(pdf_sha256, {})[kind] = output_sha256
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+manifest = ConversionManifest(os.path.join("Data", "conversion_manifest.json"))
+
+# DOCX files handed to each mammoth worker at a time when converting a backlog.
+MAMMOTH_CHUNKSIZE = 8
+
+
+def export_docx(input_pdf_path, pdf_sha256):
+    output_docx_path = input_pdf_path.replace(".pdf", ".docx")
+    start = time.perf_counter()
+    with metrics.timed("convert", "export", item=input_pdf_path):
+        with open(input_pdf_path, "rb") as f:
+            input_stream = f.read()
+        output_stream = pdf_to_docx(input_stream)
+        write_atomic(output_docx_path, output_stream)
+    manifest.record(pdf_sha256, "docx", output_docx_path)
+    print(f"PDF exported to DOCX: {output_docx_path}")
+    return time.perf_counter() - start
+
+
+def record_conversion(operation, path, seconds, error):
+    """
+    Records a conversion timed in a worker process, where metrics are not
+    written, once its result reaches the parent.
+    """
+
+    metrics.record("convert", operation, seconds or 0.0, item=path, error=error)
+
+
+class AdobeConverter:
+    """
+    Adobe PDF Services export to .docx on a thread pool (network bound),
+    feeding mammoth .docx to .html on a process pool (CPU bound). Each
+    finished export goes straight to mammoth; DOCX files already on disk
+    are submitted up front in chunks.
+    """
+
+    default_workers = 4
+    kind = "html"
+
+    def convert_all(self, pdf_paths, workers):
+        from docx_converter import convert_docx_timed
+
+        timings = []
+        exports = {}
+        backlog = []
+        pdf_sha256s = {}
+
+        with (
+            ThreadPoolExecutor(max_workers=workers) as export_pool,
+            ProcessPoolExecutor() as mammoth_pool,
+        ):
+            for input_pdf_path in pdf_paths:
+                output_docx_path = input_pdf_path.replace(".pdf", ".docx")
+                output_html_path = input_pdf_path.replace(".pdf", ".html")
+                pdf_sha256 = file_sha256(input_pdf_path)
+                pdf_sha256s[output_html_path] = pdf_sha256
+
+                if not manifest.is_current(pdf_sha256, "docx", output_docx_path):
+                    future = export_pool.submit(export_docx, input_pdf_path, pdf_sha256)
+                    exports[future] = input_pdf_path
+                elif not manifest.is_current(pdf_sha256, self.kind, output_html_path):
+                    backlog.append((output_docx_path, output_html_path))
+
+            # map submits every chunk now; results are collected at the end.
+            backlog_results = mammoth_pool.map(
+                convert_docx_timed,
+                [docx for docx, _ in backlog],
+                [html for _, html in backlog],
+                chunksize=MAMMOTH_CHUNKSIZE,
+            )
 
-    result_asset: CloudAsset = pdf_services_response.get_result().get_asset()
-    stream_asset: StreamAsset = pdf_services.get_content(result_asset)
+            streamed = []
+            for future in as_completed(exports):
+                input_pdf_path = exports[future]
+                try:
+                    seconds = future.result()
+                    error = None
+                except Exception as e:
+                    seconds = None
+                    error = f"{type(e).__name__}: {e}"
+                timings.append(("export", input_pdf_path, seconds, error))
+                if error is None:
+                    streamed.append(
+                        mammoth_pool.submit(
+                            convert_docx_timed,
+                            input_pdf_path.replace(".pdf", ".docx"),
+                            input_pdf_path.replace(".pdf", ".html"),
+                        )
+                    )
 
-    return stream_asset.get_input_stream()
+            conversions = list(backlog_results)
+            conversions += [future.result() for future in streamed]
 
+        for output_html_path, seconds, error in conversions:
+            timings.append(("mammoth", output_html_path, seconds, error))
+            record_conversion("mammoth", output_html_path, seconds, error)
+            if error is None:
+                manifest.record(
+                    pdf_sha256s[output_html_path], self.kind, output_html_path
+                )
+        return timings
 
-def docx_to_html_mammoth(docx_filename, html_filename):
+
+class LocalConverter:
+    """
+    Offline conversion that reads text and underline/strikethrough rules
+    straight from the PDF (see local_pdf_converter). CPU bound, so jobs run
+    in a process pool.
+    """
+
+    default_workers = os.cpu_count()
+    kind = "html:local"
+
+    def convert_all(self, pdf_paths, workers):
+        import local_pdf_converter
+
+        jobs = []
+        for input_pdf_path in pdf_paths:
+            output_html_path = input_pdf_path.replace(".pdf", ".html")
+            pdf_sha256 = file_sha256(input_pdf_path)
+            if not manifest.is_current(pdf_sha256, self.kind, output_html_path):
+                jobs.append((input_pdf_path, output_html_path, pdf_sha256))
+
+        timings = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            conversions = executor.map(
+                local_pdf_converter.convert_pdf_local,
+                [pdf for pdf, _, _ in jobs],
+                [html for _, html, _ in jobs],
+            )
+            for (_, _, pdf_sha256), (output_html_path, seconds, error) in zip(
+                jobs, conversions
+            ):
+                timings.append(("local", output_html_path, seconds, error))
+                record_conversion("local", output_html_path, seconds, error)
+                if error is None:
+                    manifest.record(pdf_sha256, self.kind, output_html_path)
+        return timings
+
+
+def summarize_timings(timings, report_path):
     """
-    Convert a .docx to .html using the Mammoth library.
-    Saves HTML result to 'html_filename'.
+    Writes every file's conversion time to `report_path` and prints count,
+    failures and latency percentiles per stage plus the slowest files.
     """
 
-    docx_abs = os.path.abspath(docx_filename)
-    html_abs = os.path.abspath(html_filename)
+    import pandas as pd
+
+    report = pd.DataFrame(timings, columns=["stage", "path", "seconds", "error"])
+    report.to_csv(report_path, index=False)
+    if report.empty:
+        print("Nothing to convert, every output is current")
+        return report
 
-    style_map = """u => u
-strike => s"
-"""
+    for stage, rows in report.groupby("stage"):
+        seconds = rows["seconds"].dropna()
+        summary = f"{stage}: {len(rows)} files, {rows['error'].notna().sum()} failed"
+        if not seconds.empty:
+            summary += (
+                f", total {seconds.sum():.1f}s, mean {seconds.mean():.2f}s, "
+                f"p50 {seconds.quantile(0.5):.2f}s, "
+                f"p95 {seconds.quantile(0.95):.2f}s, max {seconds.max():.2f}s"
+            )
+        print(summary)
+    print("Slowest files:")
+    print(
+        report.dropna(subset="seconds")
+        .nlargest(5, "seconds")[["stage", "path", "seconds"]]
+        .to_string(index=False)
+    )
+    print(f"Per-file conversion times written to {report_path}")
+    return report
+
+
+CONVERTERS = {"adobe": AdobeConverter, "local": LocalConverter}
 
-    with open(docx_abs, "rb") as docx_file:
-        result = mammoth.convert_to_html(docx_file, style_map=style_map)
-        html_content = result.value
 
-    with open(html_abs, "w", encoding="utf-8") as f:
-        f.write(html_content)
+def write_parity_report(pdf_paths, sample_size, workers, report_path):
+    """
+    Converts a sample of bills that already have Adobe/mammoth HTML with the
+    local backend and reports how closely the text and <u>/<s> markup agree.
+    Any existing .html counts as Adobe's unless the manifest records it as
+    the local backend's, so runs converted before the manifest are compared
+    too.
+    """
 
-    print(f"DOCX converted to HTML successfully: {html_abs}")
+    import local_pdf_converter
+    import pandas as pd
 
+    sample = []
+    for p in pdf_paths:
+        if len(sample) == sample_size:
+            break
+        html_path = p.replace(".pdf", ".html")
+        if os.path.exists(html_path) and not manifest.is_current(
+            file_sha256(p), LocalConverter.kind, html_path
+        ):
+            sample.append(p)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = list(
+            executor.map(
+                local_pdf_converter.parity_row,
+                sample,
+                [p.replace(".pdf", ".html") for p in sample],
+            )
+        )
+    if not rows:
+        print("No bills with Adobe HTML to compare against")
+        return
 
-credentials = ServicePrincipalCredentials(
-    client_id=os.getenv("PDF_SERVICES_CLIENT_ID"),
-    client_secret=os.getenv("PDF_SERVICES_CLIENT_SECRET"),
+    report = pd.DataFrame(rows)
+    report.to_csv(report_path, index=False)
+    print(
+        report.drop(columns="local_pdf_path")
+        .describe()
+        .loc[["mean", "min"]]
+        .to_string()
+    )
+    print(f"Parity report written to {report_path}")
+
+
+parser = argparse.ArgumentParser(description="Convert bill PDFs to HTML")
+parser.add_argument(
+    "--backend",
+    choices=sorted(CONVERTERS),
+    default="adobe",
+    help="adobe (PDF Services + mammoth) or local (offline, from the PDF itself)",
+)
+parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=None,
+    help="jobs kept in flight (default 4 for adobe, one per CPU for local)",
+)
+parser.add_argument(
+    "--rate",
+    type=float,
+    default=10,
+    help="maximum PDF Services API calls per second across all jobs",
+)
+parser.add_argument(
+    "--parity",
+    type=int,
+    metavar="N",
+    help="instead of converting, compare the local backend against existing "
+    "Adobe HTML for N bills and write a parity report",
 )
 
-datarun = os.getenv("DATARUN")
 
-if datarun is None:
-    print("You need to set the DATARUN environment variable")
-    sys.exit(1)
+def convert_run(datarun, backend="adobe", workers=None, rate=10):
+    """
+    Converts every PDF of a run's CSV that has no current HTML. Returns
+    the per-file timing report (see summarize_timings).
+    """
+
+    import pandas as pd
+
+    converter = CONVERTERS[backend]()
+    df = pd.read_csv(os.path.join("Data", datarun, f"idaho_bills_{datarun}.csv"))
+
+    configure(backend, rate)
+    metrics.configure(datarun)
+
+    timings = converter.convert_all(
+        list(df["local_pdf_path"]), workers or converter.default_workers
+    )
+    return summarize_timings(
+        timings, os.path.join("Data", datarun, f"conversion_times_{datarun}.csv")
+    )
+
+
+def main(argv=None):
+    import pandas as pd
 
-pdf_services = PDFServices(credentials=credentials)
+    args = parser.parse_args(argv)
 
-df = pd.read_csv("Data/{datarun}/idaho_bills_{datarun}.csv".format(datarun=datarun))
+    datarun = os.getenv("DATARUN")
 
-for input_pdf_path in df["local_pdf_path"]:
-    print(input_pdf_path)
+    if datarun is None:
+        print("You need to set the DATARUN environment variable")
+        return 1
 
-    with open(input_pdf_path, "rb") as f:
-        input_stream = f.read()
+    if args.parity:
+        df = pd.read_csv(os.path.join("Data", datarun, f"idaho_bills_{datarun}.csv"))
+        write_parity_report(
+            list(df["local_pdf_path"]),
+            args.parity,
+            args.concurrency or os.cpu_count(),
+            os.path.join("Data", datarun, f"parity_report_{datarun}.csv"),
+        )
+        return 0
 
-    output_stream = pdf_to_docx(input_stream)
-    output_path = input_pdf_path.replace(".pdf", ".docx")
+    report = convert_run(datarun, args.backend, args.concurrency, args.rate)
 
-    with open(output_path, "wb") as file:
-        file.write(output_stream)
+    failed = report.loc[report["error"].notna()]
+    if not failed.empty:
+        print(f"{len(failed)} files failed to convert; rerun to retry just those:")
+        print(failed[["stage", "path", "error"]].to_string(index=False))
+    return 0
 
 
-for input_pdf_path in df["local_pdf_path"]:
-    input_docx_path = input_pdf_path.replace(".pdf", ".docx")
-    print(input_docx_path)
-    output_html_path = input_pdf_path.replace(".pdf", ".html")
-    docx_to_html_mammoth(input_docx_path, output_html_path)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metrics
+import ml_analysis
+import pdf_to_html
+import scrape
+import section_analysis
+from pipeline_ledger import PipelineLedger
+from rate_limiter import RequestTokenLimiter
+from result_stream import ResultStream, bill_record, stream_path
+
+# openai and the PDF converters are imported by the stages that use them.
+
+
+def ledger_path(datarun):
+    return os.path.join("Data", datarun, "pipeline_ledger.sqlite")
+
+
+def analysis_key(html_sha256, context_paragraphs, by_section=True):
+    """
+    Identifies one analysis of one version of a bill: its HTML and every
+    setting that changes what the model is asked.
+    """
+
+    digest = hashlib.sha256()
+    for part in (
+        html_sha256,
+        *ml_analysis.ANALYSIS_MODELS,
+        ml_analysis.SYSTEM_MESSAGE,
+        repr(ml_analysis.TEMPERATURE),
+        repr(context_paragraphs),
+        "sections" if by_section else "bill",
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def current_sha256(path, expected):
+    """
+    True if `path` exists and still hashes to `expected`.
+    """
+
+    return (
+        expected is not None
+        and os.path.exists(path)
+        and pdf_to_html.file_sha256(path) == expected
+    )
+
+
+class Pipeline:
+    """
+    Runs scrape, convert and analyze for one DATARUN as a single pass. Each
+    bill moves through the stages on its own, so a bill is analyzed as soon
+    as its HTML exists while others are still downloading or converting.
+
+    A stage is skipped for a bill when the ledger says it already completed
+    for the same content: the PDF on disk still has the hash scraping
+    recorded, the HTML was made from that PDF and is unchanged, and the
+    .json answers that HTML with the current analysis settings.
+
+    With `by_section`, bills are analyzed one section at a time (see
+    section_analysis), so an amended bill only sends its changed sections.
+    """
+
+    def __init__(
+        self,
+        datarun,
+        backend="adobe",
+        scrape_concurrency=8,
+        convert_workers=None,
+        analysis_concurrency=8,
+        limiter=None,
+        context_paragraphs=ml_analysis.COMPACTION_CONTEXT,
+        by_section=True,
+    ):
+        self.datarun = datarun
+        self.backend = backend
+        self.converter = pdf_to_html.CONVERTERS[backend]()
+        self.scrape_concurrency = scrape_concurrency
+        self.convert_workers = convert_workers or self.converter.default_workers
+        self.analysis_concurrency = analysis_concurrency
+        self.limiter = limiter or RequestTokenLimiter(500, 450000)
+        self.context_paragraphs = context_paragraphs
+        self.by_section = by_section
+        self.sections = section_analysis.SectionStore() if by_section else None
+        self.ledger = PipelineLedger(ledger_path(datarun))
+        self.counts = Counter()
+
+    async def run(self):
+        bill_df = await asyncio.to_thread(scrape.fetch_bill_index)
+        for bill in bill_df.itertuples():
+            self.ledger.update(
+                bill.bill_number,
+                **{column: getattr(bill, column) for column in scrape.BILL_COLUMNS[1:]},
+            )
+
+        import openai
+
+        self.semaphore = asyncio.Semaphore(self.analysis_concurrency)
+        self.client = openai.AsyncOpenAI(max_retries=0)
+        # Appended to, not replaced: bills finished before a restart keep
+        # their records.
+        self.results = ResultStream(stream_path(self.datarun))
+        try:
+            with (
+                ThreadPoolExecutor(max_workers=self.scrape_concurrency) as scrape_pool,
+                ThreadPoolExecutor(max_workers=self.convert_workers) as export_pool,
+                ProcessPoolExecutor(max_workers=self.convert_workers) as cpu_pool,
+            ):
+                self.scrape_pool = scrape_pool
+                self.export_pool = export_pool
+                self.cpu_pool = cpu_pool
+                await asyncio.gather(
+                    *(self.process_bill(bill) for bill in bill_df.itertuples())
+                )
+        finally:
+            await self.client.close()
+            self.results.close()
+            scrape.manifest.save()
+
+        self.print_summary()
+        return self.bill_frame(bill_df["bill_number"])
+
+    async def process_bill(self, bill):
+        try:
+            with metrics.timed("pipeline", "scrape", item=bill.bill_number):
+                pdf_path, pdf_sha256 = await self.scrape_bill(bill)
+            with metrics.timed("pipeline", "convert", item=bill.bill_number):
+                html_path, html_sha256 = await self.convert_bill(
+                    bill.bill_number, pdf_path, pdf_sha256
+                )
+            with metrics.timed("pipeline", "analyze", item=bill.bill_number):
+                await self.analyze_bill(bill.bill_number, html_path, html_sha256)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"{bill.bill_number} failed: {error}")
+            self.ledger.record_error(bill.bill_number, error)
+            self.counts["failed"] += 1
+
+    async def scrape_bill(self, bill):
+        entry = self.ledger.get(bill.bill_number)
+        pdf_path = entry["local_pdf_path"]
+        if pdf_path and current_sha256(pdf_path, entry["pdf_sha256"]):
+            self.counts["scrape skipped"] += 1
+            return pdf_path, entry["pdf_sha256"]
+
+        loop = asyncio.get_running_loop()
+        sponsor, pdf_path = await loop.run_in_executor(
+            self.scrape_pool, scrape.scrape_bill, bill.detail_link, bill.pdf_url
+        )
+        pdf_sha256 = await asyncio.to_thread(pdf_to_html.file_sha256, pdf_path)
+        self.ledger.record_scraped(bill.bill_number, sponsor, pdf_path, pdf_sha256)
+        self.counts["scraped"] += 1
+        return pdf_path, pdf_sha256
+
+    async def convert_bill(self, bill_number, pdf_path, pdf_sha256):
+        entry = self.ledger.get(bill_number)
+        html_path = pdf_path.replace(".pdf", ".html")
+        if entry["converted_pdf_sha256"] == pdf_sha256 and current_sha256(
+            html_path, entry["html_sha256"]
+        ):
+            self.counts["convert skipped"] += 1
+            return html_path, entry["html_sha256"]
+
+        manifest = pdf_to_html.manifest
+        kind = self.converter.kind
+        if not manifest.is_current(pdf_sha256, kind, html_path):
+            loop = asyncio.get_running_loop()
+            if self.backend == "local":
+                import local_pdf_converter
+
+                operation = "local"
+                _, seconds, error = await loop.run_in_executor(
+                    self.cpu_pool,
+                    local_pdf_converter.convert_pdf_local,
+                    pdf_path,
+                    html_path,
+                )
+            else:
+                from docx_converter import convert_docx_timed
+
+                docx_path = pdf_path.replace(".pdf", ".docx")
+                if not manifest.is_current(pdf_sha256, "docx", docx_path):
+                    await loop.run_in_executor(
+                        self.export_pool,
+                        pdf_to_html.export_docx,
+                        pdf_path,
+                        pdf_sha256,
+                    )
+                operation = "mammoth"
+                _, seconds, error = await loop.run_in_executor(
+                    self.cpu_pool, convert_docx_timed, docx_path, html_path
+                )
+            pdf_to_html.record_conversion(operation, html_path, seconds, error)
+            if error is not None:
+                raise RuntimeError(error)
+            manifest.record(pdf_sha256, kind, html_path)
+            self.counts["converted"] += 1
+        else:
+            self.counts["convert reused"] += 1
+
+        html_sha256 = await asyncio.to_thread(pdf_to_html.file_sha256, html_path)
+        self.ledger.record_converted(bill_number, pdf_sha256, html_sha256)
+        return html_path, html_sha256
+
+    async def analyze_bill(self, bill_number, html_path, html_sha256):
+        entry = self.ledger.get(bill_number)
+        json_path = html_path.replace(".html", ".json")
+        key = analysis_key(html_sha256, self.context_paragraphs, self.by_section)
+        if entry["analysis_key"] == key and os.path.exists(json_path):
+            self.counts["analysis skipped"] += 1
+            return
+
+        async with self.semaphore:
+            print(f"processing {html_path}")
+            if self.by_section:
+                status, issue_data = await section_analysis.analyze_bill_sections(
+                    self.client,
+                    self.limiter,
+                    self.sections,
+                    html_path,
+                    ml_analysis.ANALYSIS_MODELS,
+                    self.context_paragraphs,
+                )
+            else:
+                for model in ml_analysis.ANALYSIS_MODELS:
+                    status, issue_data = (
+                        await ml_analysis.analyze_legislation_html_async(
+                            self.client,
+                            self.limiter,
+                            html_path,
+                            model,
+                            self.context_paragraphs,
+                        )
+                    )
+                    if status == ml_analysis.OK:
+                        break
+
+        write_json_atomic(json_path, issue_data)
+        self.results.write(bill_record(entry, status, issue_data))
+        if status != ml_analysis.OK:
+            self.ledger.record_analysis_failed(bill_number, status)
+            self.counts[f"analysis {status}"] += 1
+            return
+        self.ledger.record_analyzed(bill_number, key)
+        self.counts["analyzed"] += 1
+
+    def bill_frame(self, bill_numbers):
+        """
+        The run's bill CSV rows, in index order, from the ledger.
+        """
+
+        ledger = self.ledger.frame().set_index("bill_number")
+        columns = scrape.BILL_COLUMNS[1:] + ["sponsor", "local_pdf_path"]
+        df = ledger.loc[list(bill_numbers), columns].reset_index()
+        # Bills whose PDF never arrived are retried by the next run.
+        return df.dropna(subset=["local_pdf_path"]).reset_index(drop=True)
+
+    def print_summary(self):
+        print(
+            "Pipeline: "
+            + ", ".join(
+                f"{count} {name}" for name, count in sorted(self.counts.items())
+            )
+        )
+
+
+parser = argparse.ArgumentParser(
+    description="Scrape, convert and analyze a run in one resumable pass"
+)
+parser.add_argument(
+    "--session",
+    default=scrape.legislative_session,
+    help="legislative session to scrape (default: this year's)",
+)
+parser.add_argument(
+    "--datarun",
+    default=None,
+    help="run to create or resume (default: today's date, with the session "
+    "appended for past sessions)",
+)
+parser.add_argument(
+    "--backend",
+    choices=sorted(pdf_to_html.CONVERTERS),
+    default="adobe",
+    help="PDF to HTML converter",
+)
+parser.add_argument(
+    "--scrape-concurrency", type=int, default=8, help="detail page / PDF requests"
+)
+parser.add_argument(
+    "--scrape-rate", type=float, default=10, help="scrape requests per second"
+)
+parser.add_argument(
+    "--convert-concurrency",
+    type=int,
+    default=None,
+    help="conversion jobs (default 4 for adobe, one per CPU for local)",
+)
+parser.add_argument(
+    "--convert-rate", type=float, default=10, help="PDF Services calls per second"
+)
+parser.add_argument(
+    "--concurrency", type=int, default=8, help="OpenAI requests kept in flight"
+)
+parser.add_argument(
+    "--rpm", type=int, default=500, help="OpenAI requests per minute limit"
+)
+parser.add_argument(
+    "--tpm", type=int, default=450000, help="OpenAI tokens per minute limit"
+)
+parser.add_argument(
+    "--context",
+    type=int,
+    default=ml_analysis.COMPACTION_CONTEXT,
+    help="unchanged paragraphs kept around each edit when compacting bills",
+)
+parser.add_argument(
+    "--full-text",
+    action="store_true",
+    help="send the full bill HTML instead of compacting it",
+)
+parser.add_argument(
+    "--whole-bills",
+    action="store_true",
+    help="analyze each bill in one request instead of section by section",
+)
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    args.datarun = args.datarun or scrape.default_datarun(args.session)
+
+    scrape.configure(
+        args.datarun,
+        args.scrape_concurrency,
+        args.scrape_rate,
+        session_name=args.session,
+    )
+    metrics.configure(args.datarun)
+    pdf_to_html.configure(args.backend, args.convert_rate)
+
+    pipeline = Pipeline(
+        args.datarun,
+        backend=args.backend,
+        scrape_concurrency=args.scrape_concurrency,
+        convert_workers=args.convert_concurrency,
+        analysis_concurrency=args.concurrency,
+        limiter=RequestTokenLimiter(args.rpm, args.tpm),
+        context_paragraphs=None if args.full_text else args.context,
+        by_section=not args.whole_bills,
+    )
+    start = time.perf_counter()
+    df = asyncio.run(pipeline.run())
+    print(f"Pipeline finished in {time.perf_counter() - start:.1f}s")
+
+    # The per-stage scripts read this CSV, so they keep working on the run.
+    df.to_csv(scrape.bill_csv_path(args.datarun), index=False)
+
+    ml_analysis.llm_cache.evict()
+    print("LLM cache:", ml_analysis.llm_cache.stats())
+    ml_analysis.write_outputs(df, args.datarun)
+
+    print(f"""Pipeline complete.  Please, 'export DATARUN={args.datarun}'""")
+
+
+if __name__ == "__main__":
+    main()
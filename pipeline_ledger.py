@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+
+# Bill metadata from the index, then what each stage last produced. A stage
+# is complete for a bill when the hash it recorded still matches its input.
+COLUMNS = [
+    "bill_number",
+    "bill_title",
+    "bill_status",
+    "detail_link",
+    "pdf_url",
+    "sponsor",
+    "local_pdf_path",
+    # scrape: the PDF on disk
+    "pdf_sha256",
+    "scraped_at",
+    # convert: the PDF the HTML was made from, and the HTML
+    "converted_pdf_sha256",
+    "html_sha256",
+    "converted_at",
+    # analyze: hash of the HTML and analysis settings the .json answers
+    "analysis_key",
+    "analysis_status",
+    "analyzed_at",
+    "error",
+]
+
+
+class PipelineLedger:
+    """
+    Per-bill state of one run of the pipeline: the bill's index row and,
+    for each of scrape, convert and analyze, the content hashes the stage
+    last completed for. Every update is committed straight away, so a run
+    that is killed resumes from the last finished stage of every bill.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        columns = ", ".join(
+            f"{column} TEXT PRIMARY KEY" if column == "bill_number" else column
+            for column in COLUMNS
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS bills ({columns})")
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(bills)")}
+        for column in COLUMNS:
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE bills ADD COLUMN {column}")
+        self.conn.commit()
+
+    def get(self, bill_number):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM bills WHERE bill_number = ?", (bill_number,)
+            ).fetchone()
+        return dict(row) if row else {column: None for column in COLUMNS}
+
+    def update(self, bill_number, **fields):
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown ledger columns: {sorted(unknown)}")
+        names = ["bill_number", *fields]
+        with self.lock:
+            self.conn.execute(
+                f"""INSERT INTO bills ({", ".join(names)})
+                    VALUES ({", ".join("?" for _ in names)})
+                    ON CONFLICT (bill_number) DO UPDATE SET
+                    {", ".join(f"{name} = excluded.{name}" for name in fields)}""",
+                (bill_number, *fields.values()),
+            )
+            self.conn.commit()
+
+    def record_scraped(self, bill_number, sponsor, local_pdf_path, pdf_sha256):
+        self.update(
+            bill_number,
+            sponsor=sponsor,
+            local_pdf_path=local_pdf_path,
+            pdf_sha256=pdf_sha256,
+            scraped_at=time.time(),
+            error=None,
+        )
+
+    def record_converted(self, bill_number, pdf_sha256, html_sha256):
+        self.update(
+            bill_number,
+            converted_pdf_sha256=pdf_sha256,
+            html_sha256=html_sha256,
+            converted_at=time.time(),
+            error=None,
+        )
+
+    def record_analyzed(self, bill_number, analysis_key):
+        self.update(
+            bill_number,
+            analysis_key=analysis_key,
+            analysis_status="ok",
+            analyzed_at=time.time(),
+            error=None,
+        )
+
+    def record_analysis_failed(self, bill_number, status):
+        # No analysis_key, so the next run tries the bill again.
+        self.update(
+            bill_number,
+            analysis_key=None,
+            analysis_status=status,
+            error=f"analysis failed with every model: {status}",
+        )
+
+    def record_error(self, bill_number, error):
+        self.update(bill_number, error=error)
+
+    def frame(self):
+        import pandas as pd
+
+        with self.lock:
+            return pd.read_sql_query("SELECT * FROM bills", self.conn)
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker of a stage.
+
+    `rate` tokens are added per second up to `capacity`; `acquire` blocks until
+    a token is available so that all callers together never exceed the rate,
+    and returns how many seconds it waited.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        start = time.monotonic()
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return time.monotonic() - start
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AsyncTokenBucket:
+    """
+    asyncio counterpart of TokenBucket. Waiters are served in arrival order,
+    and a request larger than the bucket is clamped to its capacity so it
+    can still run once the bucket is full. One bucket may serve several
+    asyncio.run calls in turn: the lock is made for the loop that uses it,
+    while the tokens carry over.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = None
+        self.loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _loop_lock(self):
+        # An asyncio.Lock binds to the first loop it waits on, so a bucket
+        # reused by a later asyncio.run gets a new one.
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.lock = asyncio.Lock()
+            self.loop = loop
+        return self.lock
+
+    async def acquire(self, tokens=1):
+        start = time.monotonic()
+        tokens = min(tokens, self.capacity)
+        async with self._loop_lock():
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return time.monotonic() - start
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class RequestTokenLimiter:
+    """
+    Limits an async client by both requests per minute and tokens per minute,
+    the two budgets the OpenAI API enforces.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = AsyncTokenBucket(
+            requests_per_minute / 60, capacity=requests_per_minute
+        )
+        self.tokens = AsyncTokenBucket(
+            tokens_per_minute / 60, capacity=tokens_per_minute
+        )
+
+    async def acquire(self, tokens):
+        waited = await self.requests.acquire(1)
+        return waited + await self.tokens.acquire(tokens)
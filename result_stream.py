@@ -0,0 +1,201 @@
+import json
+import os
+
+# One stream record per analyzed bill: its CSV row, then the analysis.
+BILL_FIELDS = [
+    "bill_number",
+    "bill_title",
+    "bill_status",
+    "detail_link",
+    "pdf_url",
+    "sponsor",
+    "local_pdf_path",
+]
+RESULT_COLUMNS = BILL_FIELDS + ["json_data", "issue_count", "analysis_status"]
+
+
+def stream_path(datarun):
+    return os.path.join("Data", datarun, f"analysis_results_{datarun}.jsonl")
+
+
+def bill_record(bill, status, issue_data):
+    """
+    Stream record for a bill given as a mapping with the CSV columns.
+    """
+
+    import pandas as pd
+
+    record = {}
+    for field in BILL_FIELDS:
+        value = bill.get(field)
+        record[field] = None if pd.isna(value) else value
+    record["json_data"] = issue_data
+    record["issue_count"] = len(issue_data) if isinstance(issue_data, list) else 0
+    record["analysis_status"] = status
+    return record
+
+
+def drop_torn_tail(path):
+    """
+    Cuts a file back to its last newline, removing a line a crash left
+    half written.
+    """
+
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            step = min(1 << 16, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != end:
+            f.truncate(position)
+
+
+class ResultStream:
+    """
+    Append-only JSONL of per-bill results in the order they finish. Each
+    write is flushed and fsynced before it returns, so a crash loses at most
+    the line being written, and that torn line is dropped when the stream
+    is opened again. A bill analyzed more than once keeps its last record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            drop_torn_tail(path)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def scan(path):
+    """
+    (offset, line) of every complete line; a line still being written by a
+    running analysis is skipped.
+    """
+
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            yield offset, line
+            offset += len(line)
+
+
+def latest_index(path):
+    """
+    {bill_number: (offset, length, status, issue_count)} of the last record
+    of every bill. Only this index is held in memory, never the analyses.
+    """
+
+    index = {}
+    if not os.path.exists(path):
+        return index
+    for offset, line in scan(path):
+        record = json.loads(line)
+        index[record["bill_number"]] = (
+            offset,
+            len(line),
+            record["analysis_status"],
+            record["issue_count"],
+        )
+    return index
+
+
+def read_records(path, entries):
+    with open(path, "rb") as f:
+        for offset, length, *_ in entries:
+            f.seek(offset)
+            yield json.loads(f.read(length))
+
+
+def write_jsonl(path, records):
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def ranked_entries(index):
+    """
+    Index entries of the successfully analyzed bills, most issues first.
+    """
+
+    ranked = sorted(
+        (-issue_count, bill_number)
+        for bill_number, (_, _, status, issue_count) in index.items()
+        if status == "ok"
+    )
+    return [index[bill_number] for _, bill_number in ranked]
+
+
+def write_ranked_outputs(path, enriched_path, failed_path):
+    """
+    The index-and-sort step: one scan builds the latest-record index, which
+    is sorted by issue count; records are then copied across one at a time
+    to the ranked enriched file and, in stream order, the failed file.
+    """
+
+    index = latest_index(path)
+
+    def enriched():
+        for record in read_records(path, ranked_entries(index)):
+            del record["analysis_status"]
+            yield record
+
+    failed = sorted(entry for entry in index.values() if entry[2] != "ok")
+    return (
+        write_jsonl(enriched_path, enriched()),
+        write_jsonl(failed_path, read_records(path, failed)),
+    )
+
+
+# Records per frame when the outputs are built from a JSONL in chunks.
+CHUNK_RECORDS = 1000
+
+
+def read_chunks(path, chunksize=CHUNK_RECORDS):
+    """
+    Frames of up to `chunksize` records of a JSONL file in file order, so
+    a run's outputs can be built without holding every analysis at once.
+    """
+
+    import pandas as pd
+
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            records.append(json.loads(line))
+            if len(records) == chunksize:
+                yield pd.DataFrame(records)
+                records = []
+    if records:
+        yield pd.DataFrame(records)
+
+
+def read_ranked(path):
+    """
+    Successfully analyzed bills so far, most issues first, as a frame shaped
+    like the enriched output. Used to show a run that is still going.
+    """
+
+    import pandas as pd
+
+    records = list(read_records(path, ranked_entries(latest_index(path))))
+    return pd.DataFrame(records, columns=RESULT_COLUMNS).drop(columns="analysis_status")
@@ -1,8 +1,10 @@
+import argparse
+import hashlib
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+import lxml.html
 import os
-import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 
 from tenacity import (
@@ -13,33 +15,80 @@ from tenacity import (
     retry_if_exception_type,
 )
 from datetime import datetime
-from ratelimit import limits, sleep_and_retry
+
+import metrics
+from rate_limiter import TokenBucket
+from scrape_manifest import ScrapeManifest, link_or_copy, sha256_bytes
+
+# Module level so the benchmark harness can point scraping at a local server.
+BASE_URL = "https://legislature.idaho.gov"
+
+# The legislature's name for a session: its year, with a suffix for
+# extraordinary sessions (e.g. "2020spcl"). configure() picks the one to
+# scrape.
+legislative_session = str(datetime.now().year)
+
+BILL_COLUMNS = ["bill_number", "bill_title", "bill_status", "detail_link", "pdf_url"]
+
+# One pooled session and one rate limiter shared by every worker thread;
+# configure() sizes them and picks the run folder.
+session = requests.Session()
+rate_limiter = TokenBucket(10)
 
 current_date = datetime.now().strftime("%m_%d_%Y")
 
 dir_path = os.path.join("Data", current_date)
-os.makedirs(dir_path, exist_ok=True)
+
+# Validators and content hashes from earlier runs, used for conditional GETs.
+manifest = ScrapeManifest(os.path.join("Data", "scrape_manifest.json"))
+
+# Files derived from a PDF that stay valid as long as the PDF is unchanged.
+DERIVED_SUFFIXES = [".docx", ".html"]
+
+
+def configure(datarun, concurrency=8, rate=10, parser="lxml", session_name=None):
+    """
+    Sizes the shared session's connection pool and rate limiter, picks the
+    HTML parser and the legislative session to scrape, and points downloads
+    at Data/<datarun>. Call once before scraping.
+    """
+
+    global rate_limiter, dir_path, html_parser, legislative_session
+    html_parser = parser
+    legislative_session = session_name or legislative_session
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    rate_limiter = TokenBucket(rate)
+    dir_path = os.path.join("Data", datarun)
+    os.makedirs(dir_path, exist_ok=True)
 
 
 def write_soup_to_file(soup, filename):
     with open(filename, "w", encoding="utf-8") as f:
-        f.write(soup.prettify())
+        f.write(str(soup))
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(requests.exceptions.RequestException),
-)
-@sleep_and_retry
-@limits(calls=10, period=1)
-def parse_detail_page(detail_url):
-    base_url = "https://legislature.idaho.gov"
-    full_url = base_url + detail_url
+def text_content(element):
+    """
+    lxml counterpart of BeautifulSoup's get_text(strip=True).
+    """
+
+    return "".join(text.strip() for text in element.itertext())
+
 
-    resp = requests.get(full_url, timeout=(3, 5))
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+def parse_html(html):
+    # Parsed from UTF-8 bytes: lxml refuses str input that declares an
+    # encoding.
+    return lxml.html.document_fromstring(
+        html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8")
+    )
+
+
+def parse_sponsor_soup(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
     bill_table = soup.find("table", class_="bill-table")
 
     row = bill_table.find("tr")
@@ -47,36 +96,49 @@ def parse_detail_page(detail_url):
 
     sponsor_text = cells[2].get_text(strip=True)
 
-    sponsor = sponsor_text.replace("by ", "").strip()
+    return sponsor_text.replace("by ", "").strip()
 
-    return sponsor
 
+def parse_sponsor_lxml(html):
+    bill_table = parse_html(html).xpath(
+        "(//table[contains(concat(' ', normalize-space(@class), ' '),"
+        " ' bill-table ')])[1]"
+    )[0]
+    # The table's first row wherever it is, like BeautifulSoup's find("tr");
+    # //tr[1] would match the first row of the thead and of the tbody.
+    cells = bill_table.xpath("(.//tr)[1]/td")
+    return text_content(cells[2]).replace("by ", "").strip()
 
-@sleep_and_retry
-@limits(calls=10, period=1)
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(requests.exceptions.RequestException),
-)
-def download_pdf(url):
-    response = requests.get(url, stream=True, timeout=(3, 5))
-    response.raise_for_status()
 
-    pdf_local_path = os.path.join(dir_path, url.split("/")[-1])
+def bill_index_path(session):
+    return f"/sessioninfo/{session}/legislation/"
 
-    with open(pdf_local_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
 
-    print(f"Downloaded PDF from {pdf_url} to {pdf_local_path}")
-    return pdf_local_path
+def bill_pdf_url(session, bill_number):
+    return f"{BASE_URL}/wp-content/uploads{bill_index_path(session)}{bill_number}.pdf"
 
 
-def scrape_idaho_legislation(url):
-    response = requests.get(url)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.text, "html.parser")
+def default_datarun(session):
+    """
+    Run folder name for a scrape started today: the date, with the session
+    appended when it is not the current one so it cannot collide with
+    today's scrape of the current session.
+    """
+
+    if session == str(datetime.now().year):
+        return current_date
+    return f"{current_date}_{session}"
+
+
+def bill_index_row(bill_number, bill_title, status, detail_link):
+    pdf_url = bill_pdf_url(legislative_session, bill_number)
+    return [bill_number, bill_title, status, detail_link, pdf_url]
+
+
+def parse_bill_index_soup(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
 
     mini_tables = soup.find_all("table", class_="mini-data-table")[2:]
 
@@ -95,46 +157,269 @@ def scrape_idaho_legislation(url):
         detail_link = link_tag["href"]
         bill_number = detail_link.split("/")[-1]
         bill_title = cells[1].get_text(strip=True) if len(cells) > 1 else ""
-        pdf_url = f"https://legislature.idaho.gov/wp-content/uploads/sessioninfo/2025/legislation/{bill_number}.pdf"
         status = cells[3].get_text(strip=True)
 
-        results.append([bill_number, bill_title, status, detail_link, pdf_url])
+        results.append(bill_index_row(bill_number, bill_title, status, detail_link))
 
     return results
 
 
-url = "https://legislature.idaho.gov/sessioninfo/2025/legislation/"
-bill_data = scrape_idaho_legislation(url)
+def parse_bill_index_lxml(html):
+    """
+    Same rows as parse_bill_index_soup, with libxml2 doing the parsing and
+    XPath picking out only the bill rows.
+    """
+
+    tables = parse_html(html).xpath(
+        "//table[contains(concat(' ', normalize-space(@class), ' '),"
+        " ' mini-data-table ')]"
+    )[2:]
+
+    results = []
+    for table in tables:
+        bill_rows = table.xpath("(.//tr[starts-with(@id, 'bill')])[1]")
+        if not bill_rows:
+            continue
+
+        cells = bill_rows[0].xpath(".//td")
+        if len(cells) < 4:
+            continue
+
+        detail_link = cells[0].xpath("(.//a)[1]/@href")[0]
+        bill_number = detail_link.split("/")[-1]
+        results.append(
+            bill_index_row(
+                bill_number, text_content(cells[1]), text_content(cells[3]), detail_link
+            )
+        )
+    return results
+
 
-bill_df = pd.DataFrame(
-    bill_data,
-    columns=["bill_number", "bill_title", "bill_status", "detail_link", "pdf_url"],
+# "html.parser" is the original pure-Python BeautifulSoup parsing, kept as
+# the reference the lxml parsers are checked against (see benchmark.py).
+SPONSOR_PARSERS = {"lxml": parse_sponsor_lxml, "html.parser": parse_sponsor_soup}
+BILL_INDEX_PARSERS = {
+    "lxml": parse_bill_index_lxml,
+    "html.parser": parse_bill_index_soup,
+}
+html_parser = "lxml"
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_fixed(1),
+    retry=retry_if_exception_type(requests.exceptions.RequestException),
+    before_sleep=metrics.record_retry("scrape", "detail_page"),
+)
+def parse_detail_page(detail_url):
+    full_url = BASE_URL + detail_url
+
+    previous = manifest.get(full_url)
+    headers = manifest.conditional_headers(full_url)
+
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed(
+        "scrape", "detail_page", item=full_url, limiter_wait=limiter_wait
+    ) as event:
+        resp = session.get(full_url, headers=headers, timeout=(3, 5))
+        event["status"] = resp.status_code
+        event["bytes"] = len(resp.content)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+    if resp.status_code == 304:
+        manifest.update(full_url, resp, previous["sha256"], sponsor=previous["sponsor"])
+        return previous["sponsor"]
+
+    sha256 = sha256_bytes(resp.content)
+    if previous and previous["sha256"] == sha256:
+        manifest.update(full_url, resp, sha256, sponsor=previous["sponsor"])
+        return previous["sponsor"]
+
+    sponsor = SPONSOR_PARSERS[html_parser](resp.text)
+
+    manifest.update(full_url, resp, sha256, sponsor=sponsor)
+    return sponsor
+
+
+def reuse_previous_pdf(previous_path, pdf_local_path):
+    """
+    Link an unchanged PDF, and whatever was already derived from it, from the
+    previous run's folder into this one.
+    """
+
+    link_or_copy(previous_path, pdf_local_path)
+    for suffix in DERIVED_SUFFIXES:
+        previous_derived = previous_path.replace(".pdf", suffix)
+        if os.path.exists(previous_derived):
+            link_or_copy(previous_derived, pdf_local_path.replace(".pdf", suffix))
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_fixed(1),
+    retry=retry_if_exception_type(requests.exceptions.RequestException),
+    before_sleep=metrics.record_retry("scrape", "pdf"),
 )
+def download_pdf(url):
+    pdf_local_path = os.path.join(dir_path, url.split("/")[-1])
+    previous = manifest.get(url)
+    headers = manifest.conditional_headers(url, require_file=True)
+
+    part_path = pdf_local_path + ".part"
+    digest = hashlib.sha256()
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed(
+        "scrape", "pdf", item=url, bytes=0, limiter_wait=limiter_wait
+    ) as event:
+        response = session.get(url, headers=headers, stream=True, timeout=(3, 5))
+        event["status"] = response.status_code
+        if response.status_code != 304:
+            response.raise_for_status()
+            with open(part_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    event["bytes"] += len(chunk)
+    if response.status_code == 304:
+        reuse_previous_pdf(previous["path"], pdf_local_path)
+        print(f"Unchanged PDF {url}, reused {previous['path']}")
+        manifest.update(url, response, previous["sha256"], path=pdf_local_path)
+        return pdf_local_path
+    sha256 = digest.hexdigest()
+
+    # Servers without validators still let us skip rewriting identical files.
+    if previous and previous["sha256"] == sha256 and os.path.exists(previous["path"]):
+        os.remove(part_path)
+        reuse_previous_pdf(previous["path"], pdf_local_path)
+        print(f"Unchanged PDF {url}, reused {previous['path']}")
+    else:
+        os.replace(part_path, pdf_local_path)
+        print(f"Downloaded PDF from {url} to {pdf_local_path}")
+
+    manifest.update(url, response, sha256, path=pdf_local_path)
+    return pdf_local_path
+
+
+def scrape_idaho_legislation(url):
+    limiter_wait = rate_limiter.acquire()
+    with metrics.timed(
+        "scrape", "bill_index", item=url, limiter_wait=limiter_wait
+    ) as event:
+        response = session.get(url, timeout=(3, 30))
+        event["status"] = response.status_code
+        event["bytes"] = len(response.content)
+        response.raise_for_status()
+    return BILL_INDEX_PARSERS[html_parser](response.text)
 
-sponsors = []
-for link in bill_df["detail_link"]:
-    sponsor = parse_detail_page(link) if link else ""
-    print(sponsor)
-    sponsors.append(sponsor)
-    time.sleep(0.1)
 
-bill_df["sponsor"] = sponsors
+def fetch_bill_index(url=None):
+    """
+    The session's bill index as a frame with the BILL_COLUMNS.
+    """
 
+    import pandas as pd
 
-local_pdf_paths = []
-for pdf_url in bill_df["pdf_url"]:
-    print(pdf_url)
-    path = download_pdf(pdf_url)
-    local_pdf_paths.append(path)
-    time.sleep(0.1)
+    url = url or BASE_URL + bill_index_path(legislative_session)
+    return pd.DataFrame(scrape_idaho_legislation(url), columns=BILL_COLUMNS)
 
-bill_df["local_pdf_path"] = local_pdf_paths
 
-bill_df.to_csv(
-    os.path.join(
-        dir_path, "idaho_bills_{current_date}.csv".format(current_date=current_date)
-    ),
-    index=False,
+def scrape_bill(detail_link, pdf_url):
+    """
+    Sponsor and local PDF path of one bill.
+    """
+
+    sponsor = parse_detail_page(detail_link) if detail_link else ""
+    return sponsor, download_pdf(pdf_url)
+
+
+def scrape_bills(bill_df, concurrency=8):
+    """
+    Adds the sponsor and local_pdf_path columns to a bill index.
+    """
+
+    bill_df = bill_df.copy()
+
+    # Detail pages and PDFs go through the same pool so they overlap; the
+    # shared token bucket keeps the combined request rate under the limit.
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sponsor_futures = []
+            pdf_futures = []
+            for link, pdf_url in zip(bill_df["detail_link"], bill_df["pdf_url"]):
+                sponsor_futures.append(
+                    executor.submit(parse_detail_page, link) if link else None
+                )
+                pdf_futures.append(executor.submit(download_pdf, pdf_url))
+
+            sponsors = []
+            for future in sponsor_futures:
+                sponsor = future.result() if future else ""
+                print(sponsor)
+                sponsors.append(sponsor)
+
+            local_pdf_paths = [future.result() for future in pdf_futures]
+    finally:
+        manifest.save()
+
+    bill_df["sponsor"] = sponsors
+    bill_df["local_pdf_path"] = local_pdf_paths
+    return bill_df
+
+
+def bill_csv_path(datarun):
+    return os.path.join("Data", datarun, f"idaho_bills_{datarun}.csv")
+
+
+parser = argparse.ArgumentParser(description="Scrape Idaho legislation")
+parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=8,
+    help="number of detail page / PDF requests kept in flight",
 )
+parser.add_argument(
+    "--rate",
+    type=float,
+    default=10,
+    help="maximum requests per second across all workers",
+)
+parser.add_argument(
+    "--parser",
+    choices=sorted(BILL_INDEX_PARSERS),
+    default="lxml",
+    help="HTML parser for the index and detail pages",
+)
+parser.add_argument(
+    "--session",
+    default=legislative_session,
+    help="legislative session to scrape, e.g. 2024 or 2020spcl (default: "
+    "this year's)",
+)
+
+
+def scrape_run(datarun=None, session_name=None, concurrency=8, rate=10, parser="lxml"):
+    """
+    Scrapes a session's bills (default: this year's) into Data/<datarun>
+    and writes the run's CSV. Returns the bill frame.
+    """
+
+    session_name = session_name or legislative_session
+    datarun = datarun or default_datarun(session_name)
+    configure(datarun, concurrency, rate, parser, session_name)
+    metrics.configure(datarun)
+
+    bill_df = scrape_bills(fetch_bill_index(), concurrency)
+    bill_df.to_csv(bill_csv_path(datarun), index=False)
+    return bill_df
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    datarun = default_datarun(args.session)
+    scrape_run(datarun, args.session, args.concurrency, args.rate, args.parser)
+
+    print(f"""Scrape Successful.  Please, 'export DATARUN={datarun}'""")
+
 
-print(f"""Scrape Successful.  Please, 'export DATARUN={current_date}'""")
+if __name__ == "__main__":
+    main()
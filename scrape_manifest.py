@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+class ScrapeManifest:
+    """
+    Persistent record of what every scraped URL returned on its last fetch.
+
+    Each entry keeps the ETag / Last-Modified validators, the sha256 of the
+    body and (for PDFs) the local path it was saved to, so the next run can
+    send a conditional GET and reuse the previous file on a 304.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, url):
+        with self.lock:
+            return self.entries.get(url)
+
+    def conditional_headers(self, url, require_file=False):
+        entry = self.get(url)
+        if not entry:
+            return {}
+        if require_file and not os.path.exists(entry.get("path") or ""):
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url, response, sha256, **fields):
+        with self.lock:
+            previous = self.entries.get(url, {})
+            # A 304 may omit validators; keep the ones we already had.
+            self.entries[url] = {
+                "etag": response.headers.get("ETag") or previous.get("etag"),
+                "last_modified": response.headers.get("Last-Modified")
+                or previous.get("last_modified"),
+                "sha256": sha256,
+                **fields,
+            }
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def link_or_copy(src, dst):
+    """
+    Hard-link `src` to `dst`, falling back to a copy across filesystems.
+    Does nothing if `dst` already is `src`.
+    """
+
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
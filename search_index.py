@@ -0,0 +1,120 @@
+import os
+import re
+import sqlite3
+import sys
+
+from bill_text import html_to_text
+from result_stream import read_chunks
+
+# bm25 weights, in column order: a hit in the title or an issue label
+# outranks one buried in the statute text.
+COLUMN_WEIGHTS = {
+    "bill_number": 0.0,
+    "bill_title": 10.0,
+    "bill_text": 1.0,
+    "issues": 5.0,
+    "issue_references": 5.0,
+    "explanations": 2.0,
+}
+
+
+def index_path(datarun):
+    return os.path.join("Data", f"search_{datarun}.sqlite")
+
+
+def read_bill_text(local_pdf_path):
+    html_path = str(local_pdf_path).replace(".pdf", ".html")
+    try:
+        with open(html_path, "r", encoding="utf-8") as f:
+            return html_to_text(f.read())
+    except FileNotFoundError:
+        return ""
+
+
+def build_search_index(chunks, datarun, path=None):
+    """
+    Builds a SQLite FTS5 index with one row per bill over its title, the
+    text of its HTML and its issues' labels, references and explanations,
+    from enriched frames given one chunk of bills at a time (see
+    result_stream.read_chunks). The index is built in a temporary file and
+    swapped in whole.
+    """
+
+    path = path or index_path(datarun)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(f"""CREATE VIRTUAL TABLE bills_fts USING fts5(
+            bill_number UNINDEXED, {", ".join(list(COLUMN_WEIGHTS)[1:])},
+            tokenize='porter unicode61 remove_diacritics 2'
+        )""")
+
+    bills = 0
+
+    def rows():
+        nonlocal bills
+        for bill in (bill for df in chunks for bill in df.itertuples()):
+            bills += 1
+            issues = bill.json_data if isinstance(bill.json_data, list) else []
+            issues = [issue for issue in issues if isinstance(issue, dict)]
+            yield (
+                bill.bill_number,
+                bill.bill_title,
+                read_bill_text(bill.local_pdf_path),
+                "\n".join(str(issue.get("issue", "")) for issue in issues),
+                "\n".join(str(issue.get("references", "")) for issue in issues),
+                "\n".join(str(issue.get("explanation", "")) for issue in issues),
+            )
+
+    conn.executemany("INSERT INTO bills_fts VALUES (?, ?, ?, ?, ?, ?)", rows())
+    conn.execute("INSERT INTO bills_fts(bills_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+    print(f"Search index for {bills} bills written to {path}")
+
+
+def to_match_query(query):
+    """
+    Turns free text into an FTS5 query that matches bills containing every
+    word, so punctuation such as "Idaho Const. art. IX" is never parsed as
+    query syntax.
+    """
+
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"' for word in words)
+
+
+def search(conn, query, limit=100):
+    """
+    Ranked (bill_number, score, snippet) matches for `query`, best first.
+    """
+
+    match_query = to_match_query(query)
+    if not match_query:
+        return []
+    weights = ", ".join(str(w) for w in COLUMN_WEIGHTS.values())
+    return conn.execute(
+        f"""SELECT bill_number,
+                   bm25(bills_fts, {weights}) AS score,
+                   snippet(bills_fts, -1, '[', ']', '…', 12)
+            FROM bills_fts
+            WHERE bills_fts MATCH ?
+            ORDER BY score
+            LIMIT ?""",
+        (match_query, limit),
+    ).fetchall()
+
+
+if __name__ == "__main__":
+    # Build the index for a run from its enriched JSONL.
+    datarun = sys.argv[1] if len(sys.argv) > 1 else os.getenv("DATARUN")
+    if datarun is None:
+        print("Usage: python search_index.py <DATARUN>")
+        sys.exit(1)
+    build_search_index(
+        read_chunks(os.path.join("Data", f"idaho_bills_enriched_{datarun}.jsonl")),
+        datarun,
+    )
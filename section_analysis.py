@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+import ml_analysis
+from bill_text import chunk_bill_html, compact_bill_html, section_digest, split_sections
+
+# Shared by every run: an amended bill usually shows up in a later run than
+# the version it amends.
+SECTION_STORE_PATH = os.path.join("Data", "section_store.sqlite")
+
+
+class SectionStore:
+    """
+    The issue list found in each section analyzed section by section, keyed
+    on digests (see bill_text.section_digest) of the section and of the
+    bill's preamble it was sent with, and the analysis settings. A new
+    version of a bill with the same preamble only sends the sections whose
+    digest has no analysis yet; a section shared by unrelated bills, such as
+    an emergency clause, is analyzed for each bill.
+    """
+
+    def __init__(self, path=SECTION_STORE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT,
+                created REAL
+            )""")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(digest, preamble_digest, model, context_paragraphs):
+        hasher = hashlib.sha256()
+        for part in (
+            digest,
+            preamble_digest,
+            model,
+            ml_analysis.SYSTEM_MESSAGE,
+            repr(ml_analysis.TEMPERATURE),
+            repr(context_paragraphs),
+        ):
+            hasher.update(part.encode("utf-8"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, model):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)",
+                (key, model, json.dumps(value), time.time()),
+            )
+            self.conn.commit()
+
+
+async def analyze_section(
+    client,
+    limiter,
+    store,
+    html_content,
+    digest,
+    preamble_digest,
+    models,
+    context_paragraphs,
+):
+    """
+    (status, issue list or None, whether it came from the store) of one
+    section, sent with the bill's preamble so the model sees the title.
+    Each model is tried in turn until one succeeds.
+    """
+
+    if context_paragraphs is not None:
+        html_content = compact_bill_html(html_content, context_paragraphs)
+
+    status = ml_analysis.MISSING
+    for model in models:
+        key = SectionStore.make_key(digest, preamble_digest, model, context_paragraphs)
+        issues = store.get(key)
+        if issues is not None:
+            return ml_analysis.OK, issues, True
+
+        results = await asyncio.gather(
+            *(
+                ml_analysis.analyze_html_content_async(client, limiter, chunk, model)
+                for chunk in chunk_bill_html(html_content, ml_analysis.CHUNK_TOKENS)
+            )
+        )
+        failed = [status for status, _ in results if status != ml_analysis.OK]
+        if not failed:
+            issues = ml_analysis.merge_issue_lists([issues for _, issues in results])
+            store.set(key, issues, model)
+            return ml_analysis.OK, issues, False
+        status = failed[0]
+    return status, None, False
+
+
+async def analyze_bill_sections(
+    client,
+    limiter,
+    store,
+    local_html_path,
+    models=ml_analysis.ANALYSIS_MODELS,
+    context_paragraphs=ml_analysis.COMPACTION_CONTEXT,
+):
+    """
+    Analyzes a bill one "SECTION n." at a time and rebuilds its issue list
+    from the sections' results, reusing the stored analysis of every section
+    an earlier version with the same preamble already had. A bill without section headings is
+    analyzed as one section. Returns (status, issue list or None); the bill
+    takes the status of its first failed section.
+    """
+
+    with open(local_html_path, "r", encoding="utf-8") as f:
+        html_content = f.read()
+
+    preamble, *sections = split_sections(html_content)
+    if not sections:
+        preamble, sections = "", [html_content]
+    digests = [section_digest(section) for section in sections]
+    preamble_digest = section_digest(preamble)
+
+    with metrics.timed(
+        "analyze", "sections", item=local_html_path, sections=len(sections)
+    ) as event:
+        results = await asyncio.gather(
+            *(
+                analyze_section(
+                    client,
+                    limiter,
+                    store,
+                    preamble + section,
+                    digest,
+                    preamble_digest,
+                    models,
+                    context_paragraphs,
+                )
+                for section, digest in zip(sections, digests)
+            )
+        )
+        reused = sum(from_store for _, _, from_store in results)
+        event["reused"] = reused
+    if reused:
+        print(f"{local_html_path}: {reused} of {len(sections)} section analyses reused")
+
+    for status, _, _ in results:
+        if status != ml_analysis.OK:
+            return status, None
+    return ml_analysis.OK, ml_analysis.merge_issue_lists(
+        [issues for _, issues, _ in results]
+    )
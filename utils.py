@@ -1,16 +1,376 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import os
+import sqlite3
 from pathlib import Path
 
+import bill_history
+import bill_similarity
+import bill_store
+import metrics
+import result_stream
+import search_index
+from issue_clusters import canonical_issues
 
-@st.cache_data
-def load_data():
-    run = os.getenv("DATARUN")
+
+def history_version():
+    path = bill_history.HISTORY_PATH
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+@st.cache_data(max_entries=4)
+def list_runs(version=None):
+    if version is None:
+        return pd.DataFrame(
+            columns=["session", "datarun", "run_date", "bills", "issues"]
+        )
+    conn = bill_history.connect()
+    try:
+        return bill_history.list_runs(conn)
+    finally:
+        conn.close()
+
+
+def get_datarun():
+    """
+    The run the pages show: the one picked with select_run, else DATARUN,
+    else the newest run in the history store.
+    """
+
+    run = st.session_state.get("datarun") or os.getenv("DATARUN")
     if not run:
-        st.error("Please set DATARUN in your environment.")
-        st.stop()
-    path = Path("Data") / f"idaho_bills_enriched_{run}.jsonl"
-    df = pd.read_json(path, orient="records", lines=True)
-    return df
+        runs = list_runs(history_version())
+        if runs.empty:
+            st.error(
+                "Please set DATARUN in your environment or add a run to the "
+                "history store with `python bill_history.py`."
+            )
+            st.stop()
+        run = runs["datarun"].iloc[0]
+    return run
+
+
+def select_run():
+    """
+    Sidebar selectors for the session and the run within it that every page
+    shows, listed from the history store. Returns the selected run. Only
+    that run's data is loaded, so adding runs does not slow down a page.
+    """
+
+    run = get_datarun()
+    runs = list_runs(history_version())
+    if runs.empty:
+        return run
+
+    sessions = sorted(runs["session"].unique(), reverse=True)
+    current = runs.loc[runs["datarun"] == run, "session"]
+    session = st.sidebar.selectbox(
+        "Session",
+        sessions,
+        index=sessions.index(current.iloc[0]) if not current.empty else 0,
+    )
+    options = list(runs.loc[runs["session"] == session, "datarun"])
+    if current.empty and session == sessions[0]:
+        # A run still being analyzed is not in the history store yet.
+        options.insert(0, run)
+    run = st.sidebar.selectbox(
+        "Run", options, index=options.index(run) if run in options else 0
+    )
+    st.session_state["datarun"] = run
+    return run
+
+
+def enriched_path(run):
+    return Path("Data") / f"idaho_bills_enriched_{run}.jsonl"
+
+
+def is_partial(run):
+    """
+    True while `run` is still being analyzed: results are streaming in but
+    the ranked outputs have not been written yet.
+    """
+
+    return (
+        not bill_store.has_store(run)
+        and not enriched_path(run).exists()
+        and os.path.exists(result_stream.stream_path(run))
+    )
+
+
+def data_version(run):
+    """
+    Modification time of what the loaders read for `run`. It is part of
+    their cache keys, so a run that is still being analyzed is re-read as
+    results arrive while a finished run stays cached.
+    """
+
+    for path in (
+        bill_store.table_path("bills", run),
+        enriched_path(run),
+        result_stream.stream_path(run),
+    ):
+        if os.path.exists(path):
+            return os.stat(path).st_mtime_ns
+    return None
+
+
+# A run in progress adds an entry per version; keep only the recent ones.
+@st.cache_data(max_entries=8)
+def load_enriched_tables(run, version=None):
+    # Runs analyzed before the Parquet store existed only have the JSONL,
+    # and runs still being analyzed only have their result stream.
+    if enriched_path(run).exists():
+        df = pd.read_json(enriched_path(run), orient="records", lines=True)
+    else:
+        df = result_stream.read_ranked(result_stream.stream_path(run))
+    return bill_store.split_enriched(df)
+
+
+@st.cache_data(max_entries=32)
+def load_table(table, run, columns=None, version=None):
+    if bill_store.has_store(run):
+        return bill_store.read_table(table, run, columns)
+    bills, issues = load_enriched_tables(run, version)
+    df = bills if table == "bills" else issues
+    return df[columns] if columns else df
+
+
+def load_data(columns=None, run=None):
+    """
+    One row per bill of `run` (default: the selected run). Pass `columns`
+    to read only what the page needs.
+    """
+
+    run = run or get_datarun()
+    return load_table("bills", run, columns, data_version(run))
+
+
+def load_issues(columns=None, run=None):
+    """
+    One row per detected issue (bill_number, issue, references,
+    explanation) of `run` (default: the selected run).
+    """
+
+    run = run or get_datarun()
+    return load_table("issues", run, columns, data_version(run))
+
+
+@st.cache_data(max_entries=8)
+def load_history_session(session, dataruns=None, columns=None, version=None):
+    conn = bill_history.connect()
+    try:
+        return bill_history.read_history(conn, session, dataruns, columns)
+    finally:
+        conn.close()
+
+
+@st.cache_data(max_entries=8)
+def load_sponsor_trend_session(session, version=None):
+    conn = bill_history.connect()
+    try:
+        return bill_history.sponsor_trend(conn, session)
+    finally:
+        conn.close()
+
+
+def load_history(session, dataruns=None, columns=None):
+    """
+    History store rows (one per bill and run, with the run's date) of one
+    session, optionally only of some runs.
+    """
+
+    return load_history_session(
+        session,
+        tuple(dataruns) if dataruns is not None else None,
+        tuple(columns) if columns is not None else None,
+        history_version(),
+    )
+
+
+def load_sponsor_trend(session):
+    """
+    Total issues and bills per sponsor in every run of `session`.
+    """
+
+    return load_sponsor_trend_session(session, history_version())
+
+
+BILL_VIEW_COLUMNS = [
+    "bill_number",
+    "bill_title",
+    "bill_status",
+    "sponsor",
+    "detail_link",
+    "issue_count",
+]
+
+SORT_ORDERS = {
+    "Most issues": (["issue_count", "bill_number"], [False, True]),
+    "Bill number": (["bill_number"], [True]),
+}
+
+
+class Aggregates:
+    """
+    Everything the pages derive from a run, built once per DATARUN:
+    inverted indexes from status and sponsor to row positions, a rank per
+    sort order, per-sponsor issue totals and issue-type counts (both
+    canonical and as the model wrote them). Widget
+    changes then only index into these instead of recomputing.
+    """
+
+    def __init__(self, bills, issues):
+        self.bills = bills
+        self.status_index = {
+            key: positions
+            for key, positions in bills.groupby(
+                "bill_status", observed=True
+            ).indices.items()
+        }
+        self.sponsor_index = {
+            key: positions
+            for key, positions in bills.groupby(
+                "sponsor", observed=True
+            ).indices.items()
+        }
+        self.positions_by_bill = {
+            bill_number: position
+            for position, bill_number in enumerate(bills["bill_number"])
+        }
+        self.status_options = sorted(self.status_index)
+        self.sponsor_options = sorted(self.sponsor_index)
+
+        self.sort_ranks = {}
+        for name, (columns, ascending) in SORT_ORDERS.items():
+            order = bills.sort_values(columns, ascending=ascending).index.to_numpy()
+            rank = np.empty(len(bills), dtype=np.int64)
+            rank[order] = np.arange(len(bills))
+            self.sort_ranks[name] = rank
+
+        self.sponsor_totals = (
+            bills.groupby("sponsor", observed=True)["issue_count"]
+            .sum()
+            .reset_index()
+            .rename(columns={"issue_count": "total_issues"})
+            .sort_values("total_issues", ascending=False)
+            .reset_index(drop=True)
+        )
+
+        self.issue_type_counts = self.count_labels(issues["canonical_issue"])
+        self.raw_issue_type_counts = self.count_labels(issues["issue"])
+
+    @staticmethod
+    def count_labels(labels):
+        labels = labels.astype(str)
+        return (
+            labels[labels != ""]
+            .value_counts()
+            .rename_axis("issue_type")
+            .reset_index(name="count")
+        )
+
+    def filter_positions(self, status=None, sponsor=None):
+        positions = np.arange(len(self.bills))
+        if status is not None:
+            positions = self.status_index.get(status, positions[:0])
+        if sponsor is not None:
+            sponsor_positions = self.sponsor_index.get(sponsor, positions[:0])
+            positions = np.intersect1d(positions, sponsor_positions, assume_unique=True)
+        return positions
+
+    def sort_positions(self, positions, sort_by):
+        rank = self.sort_ranks[sort_by]
+        return positions[np.argsort(rank[positions], kind="stable")]
+
+
+@st.cache_resource(max_entries=8)
+def build_aggregates(run, version=None):
+    bills = load_table("bills", run, BILL_VIEW_COLUMNS, version).reset_index(drop=True)
+    issues = load_table("issues", run, version=version)
+    if "canonical_issue" not in issues:
+        # Stores written before issue labels were clustered.
+        issues = issues.assign(
+            canonical_issue=canonical_issues(issues["issue"], issues["references"])
+        )
+    return Aggregates(bills, issues)
+
+
+def load_aggregates():
+    """
+    Shared, read-only aggregates for the current DATARUN (see Aggregates).
+    Cached as a resource so reruns get the same object without copying.
+    """
+
+    run = get_datarun()
+    return build_aggregates(run, data_version(run))
+
+
+@st.cache_resource
+def open_search_index(run):
+    path = search_index.index_path(run)
+    if not os.path.exists(path):
+        # Build it once for runs analyzed before indexing was added.
+        if not enriched_path(run).exists():
+            return None
+        search_index.build_search_index(
+            result_stream.read_chunks(enriched_path(run)), run, path
+        )
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+@st.cache_data
+def search_run(run, query):
+    conn = open_search_index(run)
+    if conn is None:
+        return None
+    return search_index.search(conn, query)
+
+
+def search_bills(query):
+    """
+    Ranked (bill_number, score, snippet) full-text matches for the current
+    DATARUN, or None if its search index has not been built.
+    """
+
+    run = get_datarun()
+    if is_partial(run):
+        return None
+    return search_run(run, query)
+
+
+@st.cache_data(max_entries=8)
+def load_metrics_run(run, version=None):
+    return metrics.load_metrics(run)
+
+
+def load_metrics():
+    """
+    Events recorded by the stages of the DATARUN, re-read while the run is
+    still writing them.
+    """
+
+    run = get_datarun()
+    path = metrics.metrics_path(run)
+    version = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    return load_metrics_run(run, version)
+
+
+@st.cache_resource(max_entries=8)
+def load_similarity_index(run, version=None):
+    return bill_similarity.SimilarityIndex.load(bill_similarity.index_path(run))
+
+
+def similar_bills(bill_number):
+    """
+    [(bill_number, estimated similarity)] of the bills of the current
+    DATARUN similar to `bill_number`, or None if the run has no similarity
+    index yet.
+    """
+
+    run = get_datarun()
+    path = bill_similarity.index_path(run)
+    if not os.path.exists(path):
+        return None
+    index = load_similarity_index(run, os.stat(path).st_mtime_ns)
+    return index.similar(bill_number)